@@ -0,0 +1,132 @@
+import logging
+import argparse
+from datetime import date
+from typing import Optional
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Run as a command: load .env before the database module reads DATABASE_URL
+    load_dotenv()
+
+from database import engine, schema_extensions
+import models as models
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Lead table -> dimensions counted per day besides the total
+ROLLUP_DIMENSIONS = {
+    "registrations": ("heard_from", "country_code"),
+    "enrollments": ("heard_from", "preferred_batch", "country_code"),
+    "masterclass_registrations": ("country_code",),
+}
+# The dimension holding each day's total number of leads
+TOTAL = "total"
+GROUP_BY = ("day",) + tuple(sorted({dimension for dimensions in ROLLUP_DIMENSIONS.values() for dimension in dimensions}))
+
+UPSERT = "ON CONFLICT (dimension, day, lead_type, value) DO UPDATE SET count = count + excluded.count"
+
+
+def _rollup_ddl():
+    """Insert triggers adding each new lead to its day's counts, and the statements recounting a table"""
+    triggers, backfill = [], []
+    for table, dimensions in ROLLUP_DIMENSIONS.items():
+        values = [f"('{TOTAL}', date(new.created_at), '{table}', '', 1)"]
+        values += [f"('{dimension}', date(new.created_at), '{table}', coalesce(new.{dimension}, ''), 1)" for dimension in dimensions]
+        triggers.append((
+            f"{table}_rollup",
+            f"AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO lead_rollups (dimension, day, lead_type, value, count) VALUES {', '.join(values)} {UPSERT}; END"
+        ))
+        # Archived leads are counted too
+        columns = ", ".join(("created_at",) + dimensions)
+        leads = f"(SELECT {columns} FROM {table} UNION ALL SELECT {columns} FROM {models.ARCHIVE_TABLES[table].name})"
+        backfill.append(
+            f"INSERT INTO lead_rollups (dimension, day, lead_type, value, count) "
+            f"SELECT '{TOTAL}', date(created_at), '{table}', '', count(*) FROM {leads} GROUP BY 2"
+        )
+        backfill += [
+            f"INSERT INTO lead_rollups (dimension, day, lead_type, value, count) "
+            f"SELECT '{dimension}', date(created_at), '{table}', coalesce({dimension}, ''), count(*) FROM {leads} GROUP BY 2, 4"
+            for dimension in dimensions
+        ]
+    return triggers, backfill
+
+
+ROLLUP_TRIGGERS, ROLLUP_BACKFILL = _rollup_ddl()
+
+
+def backfill(conn) -> int:
+    """Recount every rollup from the lead and archive tables, in the caller's transaction; returns the rollup rows"""
+    conn.exec_driver_sql("DELETE FROM lead_rollups")
+    for statement in ROLLUP_BACKFILL:
+        conn.exec_driver_sql(statement)
+    return conn.exec_driver_sql("SELECT count(*) FROM lead_rollups").scalar()
+
+
+def create_rollup_triggers(conn):
+    """Install the rollup triggers, counting the existing leads when they are new.
+
+    Leads are only ever added to the rollups: deleting a lead does not take it
+    out of its day's counts, and neither does moving it to the archive. Runs in the schema transaction, so no lead can be
+    written between the backfill and the triggers taking over.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    installed = conn.exec_driver_sql(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%\\_rollup' ESCAPE '\\'"
+    ).scalar()
+    for name, body in ROLLUP_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+    if not installed:
+        logger.info(f"Lead rollups backfilled: {backfill(conn)} rows")
+
+
+schema_extensions.append(("\n".join(f"{name} {body}" for name, body in ROLLUP_TRIGGERS), create_rollup_triggers))
+
+
+def lead_analytics(db, group_by: str, since: Optional[date] = None, until: Optional[date] = None,
+                   lead_type: Optional[str] = None, daily: bool = False):
+    """Sum the rollups of one dimension (or the daily totals) over [since, until).
+
+    Reads one range of the rollup key per call, so the cost grows with the
+    number of days and distinct values, not with the number of leads.
+    """
+    rollup = models.LeadRollup
+    dimension = TOTAL if group_by == "day" else group_by
+    query = db.query(rollup.day, rollup.lead_type, rollup.value, rollup.count).filter(rollup.dimension == dimension)
+    if since is not None:
+        query = query.filter(rollup.day >= since)
+    if until is not None:
+        query = query.filter(rollup.day < until)
+    if lead_type is not None:
+        query = query.filter(rollup.lead_type == lead_type)
+
+    by_day = daily or group_by == "day"
+    totals = {}
+    for day, type, value, count in query:
+        key = (day if by_day else None, type, value)
+        totals[key] = totals.get(key, 0) + count
+
+    rows = []
+    for (day, type, value), count in totals.items():
+        row = {"lead_type": type, "count": count}
+        if by_day:
+            row["day"] = day.isoformat()
+        if group_by != "day":
+            row["value"] = value or None
+        rows.append(row)
+    rows.sort(key=lambda row: (row.get("day", ""), -row["count"], row["lead_type"], row.get("value") or ""))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lead analytics rollups")
+    parser.add_argument("command", choices=["backfill"], help="backfill: recount every rollup from the lead and archive tables")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as conn:
+        print(f"Backfilled {backfill(conn)} rollup rows")
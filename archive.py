@@ -0,0 +1,145 @@
+import os
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Run as a command: load .env before the database module reads DATABASE_URL
+    load_dotenv()
+
+from sqlalchemy import delete, func, insert, select, update
+
+from database import engine, run_db
+from lead_summary import lead_summary, CATEGORIES
+import models as models
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Leads older than this many days are moved to the archive tables (0 turns archiving off)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+# Leads moved per transaction, so a sign-up never waits long for the write lock
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Seconds between archive runs in the server
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "86400"))
+
+
+def archive_batch(model, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to `batch_size` of the oldest leads created before `cutoff` to the archive; returns how many moved.
+
+    The copy, the delete and the archive's row count commit together. The
+    newest lead of the table always stays, so SQLite never hands its id out
+    again and an id names one lead whichever table it is in.
+    """
+    table, archive = model.__table__, models.ARCHIVE_TABLES[model.__tablename__]
+    state = models.LeadArchive.__table__
+    newest = select(func.max(table.c.id)).scalar_subquery()
+    # Oldest first along the (created_at, id) index
+    chunk = select(table.c.id)\
+        .where(table.c.created_at < cutoff, table.c.id < newest)\
+        .order_by(table.c.created_at, table.c.id)\
+        .limit(batch_size)
+
+    with engine.begin() as conn:
+        conn.execute(insert(archive).from_select(list(table.columns.keys()), select(*table.columns).where(table.c.id.in_(chunk))))
+        moved = conn.execute(delete(table).where(table.c.id.in_(chunk))).rowcount
+        if not moved:
+            return 0
+        archived_until = conn.execute(select(func.max(archive.c.created_at))).scalar()
+        values = {"archived_until": archived_until, "updated_at": datetime.now()}
+        updated = conn.execute(
+            update(state).where(state.c.lead_type == table.name).values(rows=state.c.rows + moved, **values)
+        ).rowcount
+        if not updated:
+            conn.execute(insert(state).values(lead_type=table.name, rows=moved, **values))
+    return moved
+
+
+class LeadArchiver:
+    """Moves old leads out of the lead tables into their archive tables.
+
+    The lead tables and their indexes then only hold recent leads and stay
+    small enough for the page cache. Reads that go further back (cursor pages
+    past the newest archived lead, exports, search) continue in the archive,
+    and the lead summary counts both.
+    """
+
+    def __init__(self, after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.archived = 0
+        self.last_run = None
+        self._task = None
+
+    def cutoff(self) -> datetime:
+        return datetime.now() - timedelta(days=self.after_days)
+
+    async def run(self, cutoff: Optional[datetime] = None):
+        """Archive every lead created before `cutoff` (by default ARCHIVE_AFTER_DAYS ago), batch by batch.
+
+        Each batch is its own transaction on the DB executor, so sign-ups get
+        the write lock between batches. Returns the leads moved per table.
+        """
+        cutoff = cutoff or self.cutoff()
+        moved = {}
+        for category, (model, _) in CATEGORIES.items():
+            moved[category] = 0
+            while True:
+                count = await run_db(archive_batch, model, cutoff, self.batch_size)
+                moved[category] += count
+                if count < self.batch_size:
+                    break
+
+        self.last_run = datetime.now()
+        if any(moved.values()):
+            self.archived += sum(moved.values())
+            # The summary recounts the lead and archive tables, which also bumps the
+            # versions keying cached pages that were numbered from the lead tables
+            lead_summary.invalidate()
+            logger.info(f"Archived leads created before {cutoff.isoformat()}: {moved}")
+        return moved
+
+    def start(self, interval: float = ARCHIVE_INTERVAL):
+        """Archive now and then every `interval` seconds on the running event loop"""
+        if self._task is None and self.after_days > 0:
+            self._task = asyncio.create_task(self._archive_forever(interval), name="lead-archiver")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _archive_forever(self, interval: float):
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Error archiving leads: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        return {
+            "after_days": self.after_days,
+            "archived": self.archived,
+            "last_run": self.last_run.isoformat() if self.last_run else None
+        }
+
+
+# Shared archiver for this process
+lead_archiver = LeadArchiver()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old leads to the archive tables")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive leads created before this many days ago")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="leads moved per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    archiver = LeadArchiver(args.older_than_days, args.batch_size)
+    print(f"Archived {asyncio.run(archiver.run())}")
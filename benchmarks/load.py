@@ -0,0 +1,232 @@
+"""Load test every endpoint of the app in-process and report latency percentiles.
+
+Starts main:app (with its lifespan) against a fresh SQLite database and the
+fake SMS backend, seeds the lead tables, then drives each scenario through
+httpx's ASGI transport at the given concurrency. Results (throughput and
+p50/p95/p99 per scenario) are printed and written to a JSON file; pass an
+earlier file with --compare to see the change.
+
+Run with: python -m benchmarks.load [--requests 500] [--concurrency 32] [--scenarios register,all_leads]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import sqlite3
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+parser.add_argument("--concurrency", type=int, default=32)
+parser.add_argument("--seed", type=int, default=5000, help="leads seeded per table")
+parser.add_argument("--scenarios", default="", help="comma-separated subset of scenarios to run")
+parser.add_argument("--response-cache", action="store_true", help="keep the admin response cache on (off by default so listings do real work)")
+parser.add_argument("--pdf-size", type=int, default=2 * 1024 * 1024, help="size of the generated curriculum PDF if the real one is missing")
+parser.add_argument("--output", default=None, help="JSON results file (default benchmarks/results/load-<timestamp>.json)")
+parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+args = parser.parse_args()
+
+# Point the app at a throwaway database and fake SMS before importing it
+directory = tempfile.mkdtemp(prefix="bench-load-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+os.environ["SMS_BACKEND"] = "fake"
+# One client IP sends every request, so lift the OTP rate limits
+for name in ("OTP_PHONE_BURST", "OTP_IP_BURST"):
+    os.environ[name] = str(10 ** 9)
+if not args.response_cache:
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+import httpx
+
+import main
+import models as models
+from database import SessionLocal, ensure_schema
+from lead_summary import lead_summary
+
+logging.getLogger().setLevel(logging.WARNING)
+
+ENROLLMENT = {
+    "name": "Load Test",
+    "email": "load@example.com",
+    "current_role": "Engineer",
+    "experience": "3",
+    "programming_experience": "3",
+    "goals": "Ship AI products",
+    "preferred_batch": "weekend"
+}
+
+
+def seed_leads(count: int):
+    """Bulk insert `count` leads per table, spread over the last 30 days"""
+    now = datetime.now()
+    stamps = sorted(now - timedelta(seconds=random.randint(0, 30 * 86400)) for _ in range(count))
+    common = [{"name": f"Lead {i}", "phone": f"8{i:09d}", "country_code": "+91", "created_at": stamp} for i, stamp in enumerate(stamps)]
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(models.Registration, [dict(row, email=f"r{i}@example.com") for i, row in enumerate(common)])
+        db.bulk_insert_mappings(models.Enrollment, [dict(ENROLLMENT, **row, payment_status=False) for row in common])
+        db.bulk_insert_mappings(models.MasterclassRegistration, [dict(row, attended=False) for row in common])
+        db.commit()
+    finally:
+        db.close()
+    lead_summary.invalidate()
+
+
+def ensure_curriculum():
+    """Serve a generated PDF when the real curriculum is not checked out"""
+    if not os.path.isfile(main.curriculum_pdf.path):
+        path = os.path.join(directory, "curriculum.pdf")
+        with open(path, "wb") as file:
+            file.write(b"%PDF-1.4\n" + os.urandom(args.pdf_size))
+        main.curriculum_pdf.path = path
+        main.curriculum_pdf.refresh()
+
+
+async def cursor_at_depth(client, path: str, depth: int, page_size: int = 10):
+    """Follow next_cursor `depth` pages deep and return the cursor"""
+    cursor = None
+    for _ in range(depth):
+        params = {"page_size": page_size, **({"cursor": cursor} if cursor else {})}
+        cursor = (await client.get(path, params=params)).json()["next_cursor"]
+    return cursor
+
+
+def build_scenarios(client, cursors):
+    """Scenario name -> function(i) returning the i-th request's awaitable"""
+    phone = lambda i: f"7{i:09d}"
+    return {
+        "send_otp": lambda i: client.post("/api/send-otp", json={"phone": phone(i), "country_code": "+91"}),
+        "verify_otp": lambda i: client.post("/api/verify-otp", json={"phone": phone(i), "country_code": "+91", "otp": "123456"}),
+        "register": lambda i: client.post("/api/register", json={"name": f"Load {i}", "phone": phone(i), "email": "load@example.com"}),
+        "enroll": lambda i: client.post("/api/enroll", json=dict(ENROLLMENT, phone=phone(i))),
+        "masterclass_register": lambda i: client.post("/api/masterclass-register", json={"name": f"Load {i}", "phone": phone(i)}),
+        "registrations_page_1": lambda i: client.get("/api/registrations", params={"page_size": 10}),
+        "registrations_page_100": lambda i: client.get("/api/registrations", params={"page_size": 10, "page": 100}),
+        "registrations_cursor_100": lambda i: client.get("/api/registrations", params={"page_size": 10, "cursor": cursors["registrations"]}),
+        "enrollments_page_1_size_100": lambda i: client.get("/api/enrollments", params={"page_size": 100}),
+        "masterclass_page_1": lambda i: client.get("/api/masterclass-registrations", params={"page_size": 10}),
+        "timeline_cursor_100": lambda i: client.get("/api/leads/timeline", params={"page_size": 10, "cursor": cursors["timeline"]}),
+        "search": lambda i: client.get("/api/leads/search", params={"q": f"Lead {i % 1000}", "page_size": 10}),
+        "all_leads": lambda i: client.get("/api/all-leads"),
+        "curriculum": lambda i: client.get("/api/curriculum"),
+        "curriculum_range": lambda i: client.get("/api/curriculum", headers={"Range": "bytes=0-65535"}),
+    }
+
+
+async def setup(name: str, requests: int):
+    """Prepare state a scenario depends on"""
+    if name == "verify_otp":
+        # Every verification consumes a stored code
+        for i in range(requests):
+            await main.otp_store.aput(f"+917{i:09d}", "123456")
+
+
+async def run_scenario(request, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await request(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(latencies[-1] * 1000, 3)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path: str):
+    with open(baseline_path) as file:
+        baseline = json.load(file)["scenarios"]
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before:
+            print(f"{name:>28}: {before['requests_per_second']:9.1f} -> {result['requests_per_second']:9.1f} req/s, "
+                  f"p95 {before['p95_ms']:8.2f} -> {result['p95_ms']:8.2f} ms")
+
+
+async def run():
+    random.seed(0)
+    ensure_schema()
+    seed_leads(args.seed)
+    ensure_curriculum()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            cursors = {
+                "registrations": await cursor_at_depth(client, "/api/registrations", 100),
+                "timeline": await cursor_at_depth(client, "/api/leads/timeline", 100),
+            }
+            scenarios = build_scenarios(client, cursors)
+            selected = [name.strip() for name in args.scenarios.split(",") if name.strip()] or list(scenarios)
+            unknown = set(selected) - set(scenarios)
+            if unknown:
+                sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}. Available: {', '.join(scenarios)}")
+
+            results = {}
+            for name in selected:
+                await setup(name, args.requests)
+                results[name] = await run_scenario(scenarios[name], args.requests, args.concurrency)
+                result = results[name]
+                print(f"{name:>28}: {result['requests_per_second']:9.1f} req/s  p50 {result['p50_ms']:8.2f}  "
+                      f"p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}")
+    return results
+
+
+def benchmark():
+    results = asyncio.run(run())
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "args": vars(args)
+        },
+        "scenarios": results
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,106 @@
+"""Per-row CPU and allocations of one listing page, ORM path vs projected fast path.
+
+Builds the /api/enrollments response body for one page the way the endpoint
+used to (full ORM objects, model_validate per row, FastAPI's generic encoder
+over PaginatedResponse[Any]) and the way it does now (projected row tuples,
+PageEncoder). Both include the page query against a fresh SQLite database.
+
+Run with: python -m benchmarks.serialization [--page-size 100] [--repeat 500]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--page-size", type=int, default=100)
+parser.add_argument("--repeat", type=int, default=500)
+parser.add_argument("--rows", type=int, default=5000)
+args = parser.parse_args()
+
+# Point the app modules at a throwaway database before importing them
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-serialize-'), 'bench.db')}"
+
+from fastapi.encoders import jsonable_encoder
+
+from database import Base, SessionLocal, engine
+import models as models
+import schemas as schemas
+from pagination import keyset_page
+from serialization import item_columns, PageEncoder
+
+encoder = PageEncoder(schemas.EnrollmentItem)
+
+
+def page_fields(next_cursor):
+    return {"total": args.rows, "page": 1, "page_size": args.page_size, "total_pages": 1, "next_cursor": next_cursor}
+
+
+def orm_page(session) -> bytes:
+    rows, next_cursor = keyset_page(session.query(models.Enrollment), models.Enrollment, args.page_size)
+    items = [schemas.EnrollmentItem.model_validate(row) for row in rows]
+    page = schemas.PaginatedResponse(items=items, **page_fields(next_cursor))
+    return json.dumps(jsonable_encoder(page)).encode()
+
+
+def projected_page(session) -> bytes:
+    rows, next_cursor = keyset_page(
+        session.query(*item_columns(models.Enrollment, schemas.EnrollmentItem)), models.Enrollment, args.page_size
+    )
+    return encoder.encode(items=rows, **page_fields(next_cursor))
+
+
+def measure(build):
+    session = SessionLocal()
+    try:
+        build(session)
+        started = time.process_time()
+        for _ in range(args.repeat):
+            build(session)
+            # A request gets a fresh identity map
+            session.expunge_all()
+        cpu = (time.process_time() - started) / args.repeat
+
+        tracemalloc.start()
+        build(session)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        session.expunge_all()
+    finally:
+        session.close()
+    return {
+        "cpu_us_per_row": round(cpu * 1e6 / args.page_size, 2),
+        "peak_bytes_per_row": round(peak / args.page_size)
+    }
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    session.bulk_insert_mappings(models.Enrollment, [
+        {
+            "name": f"Lead {i}", "email": f"lead{i}@example.com", "phone": f"9{i:09d}", "country_code": "+91",
+            "current_role": "Engineer", "experience": "3", "programming_experience": "3",
+            "goals": "Ship AI products", "preferred_batch": "weekend", "created_at": datetime.now(), "payment_status": False
+        }
+        for i in range(args.rows)
+    ])
+    session.commit()
+    session.close()
+
+    # Same body either way (modulo key order), or the comparison is meaningless
+    session = SessionLocal()
+    assert json.loads(orm_page(session)) == json.loads(projected_page(session))
+    session.close()
+
+    results = {name: measure(build) for name, build in [("orm", orm_page), ("projected", projected_page)]}
+    for name, result in results.items():
+        print(f"{name:>10}: {result['cpu_us_per_row']:8.2f} us CPU/row, {result['peak_bytes_per_row']:6d} B peak/row")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare SQLite's default settings with the tuned pragmas from database.py.
+
+Runs single-row insert transactions (one per lead, like the write endpoints)
+while reader threads run newest-first listing queries, and reports writes and
+reads per second for both configurations.
+
+Run with: python -m benchmarks.sqlite_engine [--seconds 5] [--readers 4]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+from sqlalchemy import desc
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine, SQLITE_PRAGMAS
+import models as models
+
+
+def run(pragmas, seconds: float, readers: int):
+    """Return (writes/s, reads/s) for one configuration on a fresh database file"""
+    directory = tempfile.mkdtemp(prefix="bench-sqlite-")
+    engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", pragmas=pragmas)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+
+    def writer():
+        while not stop.is_set():
+            with Session() as db:
+                db.add(models.Registration(
+                    name="Benchmark",
+                    email="bench@example.com",
+                    phone="9000000000",
+                    country_code="+91",
+                    created_at=datetime.now()
+                ))
+                db.commit()
+            writes[0] += 1
+
+    def reader(slot):
+        while not stop.is_set():
+            with Session() as db:
+                db.query(models.Registration)\
+                    .order_by(desc(models.Registration.created_at), desc(models.Registration.id))\
+                    .limit(10)\
+                    .all()
+            reads[slot] += 1
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return writes[0] / seconds, sum(reads) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    results = {}
+    for name, pragmas in [("default", {"busy_timeout": SQLITE_PRAGMAS["busy_timeout"]}), ("tuned", SQLITE_PRAGMAS)]:
+        writes, reads = run(pragmas, args.seconds, args.readers)
+        results[name] = {"writes_per_second": round(writes, 1), "reads_per_second": round(reads, 1)}
+        print(f"{name:>8}: {writes:10.1f} writes/s {reads:10.1f} reads/s")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Time from process start to the first response, as after a spin-down.
+
+Launches `uvicorn main:app` the way render.yaml does, against a temporary
+SQLite database and the fake SMS backend, and polls until the first request
+is answered. Each run is a fresh process, so it pays every import and the
+startup work. "first boot" runs start from an empty database; "restart" runs
+reuse one that already has the schema. The import time of main alone is
+measured separately.
+
+Run with: python -m benchmarks.startup [--runs 5] [--path /api/all-leads]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+import urllib.error
+import urllib.request
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--runs", type=int, default=5, help="process starts per case")
+parser.add_argument("--path", default="/", help="endpoint requested as soon as the server is up")
+parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for a server to answer")
+args = parser.parse_args()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment(database_path: str):
+    env = dict(os.environ)
+    env.update(DATABASE_URL=f"sqlite:///{database_path}", SMS_BACKEND="fake")
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(database_path: str) -> float:
+    """Start a server and return the seconds until `args.path` answers"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{args.path}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=environment(database_path), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < args.timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with status {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=args.timeout) as response:
+                    response.read()
+                return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError(f"No response from {url} within {args.timeout} s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def import_time(database_path: str) -> float:
+    """Seconds to import main in a fresh interpreter"""
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, env=environment(database_path),
+                                     stderr=subprocess.DEVNULL, text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def summarize(name: str, samples):
+    samples = [sample * 1000 for sample in samples]
+    print(f"{name:>14}: median {statistics.median(samples):8.1f} ms  min {min(samples):8.1f}  max {max(samples):8.1f}  ({len(samples)} runs)")
+
+
+def benchmark():
+    directory = tempfile.mkdtemp(prefix="bench-startup-")
+    existing = os.path.join(directory, "existing.db")
+
+    # Bring the shared database to the current schema first
+    time_to_first_response(existing)
+
+    first_boot = [time_to_first_response(os.path.join(directory, f"empty-{i}.db")) for i in range(args.runs)]
+    restart = [time_to_first_response(existing) for _ in range(args.runs)]
+    imports = [import_time(existing) for _ in range(args.runs)]
+
+    print(f"Time to first response from {args.path}:")
+    summarize("first boot", first_boot)
+    summarize("restart", restart)
+    summarize("import main", imports)
+
+
+if __name__ == "__main__":
+    benchmark()
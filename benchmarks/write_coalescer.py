@@ -0,0 +1,73 @@
+"""Burst insert throughput with and without group commit.
+
+Fires concurrent registration inserts through WriteCoalescer, once with
+coalescing disabled (one transaction per insert) and once with the
+configured window, against a fresh SQLite database with the app's pragmas.
+
+Run with: python -m benchmarks.write_coalescer [--requests 2000] [--concurrency 100]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--requests", type=int, default=2000)
+parser.add_argument("--concurrency", type=int, default=100)
+parser.add_argument("--synchronous", default=None, help="override SQLITE_SYNCHRONOUS, e.g. FULL")
+args = parser.parse_args()
+
+# Point the app modules at a throwaway database before importing them
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-coalesce-'), 'bench.db')}"
+if args.synchronous:
+    os.environ["SQLITE_SYNCHRONOUS"] = args.synchronous
+
+from database import Base, engine
+import models as models
+from write_coalescer import WriteCoalescer, WRITE_COALESCE_WINDOW_MS, WRITE_COALESCE_MAX_BATCH
+
+
+def new_registration(session):
+    registration = models.Registration(
+        name="Benchmark",
+        email="bench@example.com",
+        phone="9000000000",
+        country_code="+91",
+        created_at=datetime.now()
+    )
+    session.add(registration)
+    return registration
+
+
+async def burst(coalescer, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return (await coalescer.submit(new_registration)).id
+
+    started = time.perf_counter()
+    ids = await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - started
+    assert len(set(ids)) == requests
+    return requests / elapsed
+
+
+async def main():
+    Base.metadata.create_all(bind=engine)
+    results = {}
+    for name, coalescer in [
+        ("one_commit_per_insert", WriteCoalescer(window_ms=0, max_batch=1)),
+        ("group_commit", WriteCoalescer(WRITE_COALESCE_WINDOW_MS, WRITE_COALESCE_MAX_BATCH)),
+    ]:
+        rate = await burst(coalescer, args.requests, args.concurrency)
+        results[name] = {"inserts_per_second": round(rate, 1), **coalescer.stats()}
+        print(f"{name:>22}: {rate:10.1f} inserts/s, {coalescer.stats()['average_batch']} rows per commit")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
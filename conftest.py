@@ -0,0 +1,132 @@
+"""Shared fixtures for the API tests.
+
+`api` imports the app against a throwaway SQLite database, once per test
+module, and `statements` records the SQL run while a test runs so its
+EXPLAIN QUERY PLAN can be checked with assert_indexed().
+"""
+import os
+import re
+import sys
+import itertools
+import importlib
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Ordered index walk, e.g. "SCAN registrations USING INDEX ix_registrations_created_at_id"
+INDEX_WALK = re.compile(r"^SCAN \w+ USING (COVERING )?INDEX ")
+
+LEAD_TABLES = ("registrations", "enrollments", "masterclass_registrations")
+# The lead summary's check for other writers, one max(id) primary key lookup per table
+MAX_ID_LOOKUP = re.compile(r"SELECT max\(\w+\.id\) AS \w+\s+FROM \w+")
+
+
+def app_modules():
+    """Names of the imported application modules, which read their settings at import"""
+    names = []
+    for name, module in sys.modules.items():
+        path = getattr(module, "__file__", None) or ""
+        if os.path.dirname(os.path.abspath(path)) == ROOT and not name.startswith(("test_", "conftest")):
+            names.append(name)
+    return names
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """Import the app against a fresh database in a temporary directory"""
+    with pytest.MonkeyPatch.context() as mp:
+        database_path = tmp_path_factory.mktemp("api") / "api.db"
+        mp.setenv("DATABASE_URL", f"sqlite:///{database_path}")
+        mp.setenv("SMS_BACKEND", "fake")
+        mp.setenv("OTP_BACKEND", "sqlite")
+        # Archiving is run by the tests that cover it
+        mp.setenv("ARCHIVE_AFTER_DAYS", "0")
+        for name in app_modules():
+            sys.modules.pop(name, None)
+        main = importlib.import_module("main")
+
+        from fastapi.testclient import TestClient
+        with TestClient(main.app) as client:
+            # Let the startup warm-up finish so its queries are not attributed to a test
+            async def warmed_up():
+                await main.app.state.warmup
+            client.portal.call(warmed_up)
+            yield main, client
+
+
+@pytest.fixture
+def statements(api):
+    """Collect the SELECT/UPDATE/DELETE statements executed while the test runs"""
+    main, _ = api
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    event.listen(main.engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(main.engine, "before_cursor_execute", capture)
+
+
+def plan_problems(engine, statement, parameters):
+    """Return the EXPLAIN QUERY PLAN lines of `statement` that are not index lookups"""
+    with engine.connect() as conn:
+        plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+    bounded = " LIMIT " in statement.upper()
+    problems = []
+    for detail in plan:
+        if "TEMP B-TREE" in detail:
+            problems.append(detail)
+        elif detail.startswith("SCAN") and detail != "SCAN CONSTANT ROW":
+            if not (bounded and INDEX_WALK.match(detail)):
+                problems.append(detail)
+    return problems
+
+
+def lead_table_reads(captured):
+    """The captured statements that read the lead tables, apart from the max id lookups"""
+    reads = []
+    for statement, _ in captured:
+        rest = MAX_ID_LOOKUP.sub("", statement)
+        if any(f"FROM {table}" in rest for table in LEAD_TABLES):
+            reads.append(statement)
+    return reads
+
+
+def assert_indexed(engine, captured):
+    assert captured, "no statements were captured"
+    failures = []
+    for statement, parameters in captured:
+        problems = plan_problems(engine, statement, parameters)
+        if problems:
+            failures.append(f"{' '.join(statement.split())}\n    -> {'; '.join(problems)}")
+    assert not failures, "Unindexed queries:\n" + "\n".join(failures)
+
+
+ENROLLMENT = {
+    "name": "Plan Test",
+    "email": "plan@example.com",
+    "phone": "9000000000",
+    "current_role": "Engineer",
+    "experience": "3",
+    "programming_experience": "3",
+    "goals": "Ship AI products",
+    "preferred_batch": "weekend"
+}
+
+
+# Sign-ups from a phone number already used within the duplicate window are replayed
+serial_numbers = itertools.count()
+
+
+def seed_leads(client, count=12):
+    """Sign up `count` leads of each kind, each with its own phone number"""
+    for _ in range(count):
+        i = next(serial_numbers)
+        client.post("/api/register", json={"name": f"Lead {i}", "phone": f"90{i:08d}", "email": f"l{i}@example.com"})
+        client.post("/api/enroll", json=dict(ENROLLMENT, phone=f"91{i:08d}"))
+        client.post("/api/masterclass-register", json={"name": f"Lead {i}", "phone": f"92{i:08d}"})
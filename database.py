@@ -1,19 +1,202 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex, CreateTable
+from concurrent.futures import ThreadPoolExecutor
 import os
+import hashlib
+import logging
+import asyncio
+import functools
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Database URL, defaults to the local SQLite file
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./rbyte_ai.db")
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+
+# Threads running blocking database calls for async endpoints. Admin listings get
+# their own lane so a slow report never holds up OTP and registration traffic.
+# Together they should not exceed DB_POOL_SIZE + DB_MAX_OVERFLOW connections.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+DB_ADMIN_EXECUTOR_WORKERS = int(os.getenv("DB_ADMIN_EXECUTOR_WORKERS", "2"))
+
+# SQLite connection pragmas. WAL lets readers run while a write commits and,
+# with synchronous=NORMAL, only fsyncs at checkpoints instead of every commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    # Negative values are KiB: 64 MiB page cache per connection
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def _is_memory_url(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def create_db_engine(url: str = DATABASE_URL, pragmas: dict = None, **engine_options):
+    """Create an engine for `url` with the configured pool and, for SQLite, pragmas.
+
+    `pragmas` overrides SQLITE_PRAGMAS; pass {} to keep SQLite's defaults.
+    """
+    if not url.startswith("sqlite"):
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+        options.update(engine_options)
+        return create_engine(url, **options)
+
+    options = {"connect_args": {"check_same_thread": False}}
+    if not _is_memory_url(url):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    options.update(engine_options)
+    sqlite_engine = create_engine(url, **options)
+
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(sqlite_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return sqlite_engine
 
-# SQLite database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./rbyte_ai.db"
 
 # Create SQLAlchemy engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_db_engine()
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
+
+
+def create_indexes(bind=engine):
+    """Create declared indexes that are missing on existing tables.
+
+    create_all only emits CREATE INDEX together with CREATE TABLE, so indexes
+    added to a model later would never reach an existing database.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+# Schema objects SQLAlchemy does not model, such as FTS tables and triggers, as
+# (ddl, create) pairs added by the modules that own them. The ddl text is part
+# of the schema version; create(connection) runs after create_all and must be
+# safe to run again.
+schema_extensions = []
+
+
+def schema_version(bind=engine) -> int:
+    """Fingerprint of the DDL for every declared table and index, as a positive 31-bit int"""
+    ddl = []
+    for table in Base.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=bind.dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            ddl.append(str(CreateIndex(index).compile(dialect=bind.dialect)))
+    ddl.extend(extension_ddl for extension_ddl, _ in schema_extensions)
+    digest = hashlib.blake2b("\n".join(ddl).encode(), digest_size=4).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFF or 1
+
+
+def create_schema(bind=engine):
+    """Create missing tables, indexes and schema extensions"""
+    Base.metadata.create_all(bind=bind)
+    create_indexes(bind)
+    with bind.begin() as conn:
+        for _, create in schema_extensions:
+            create(conn)
+
+
+def ensure_schema(bind=engine) -> bool:
+    """Create missing tables and indexes, skipping the DDL when the schema is already current.
+
+    On SQLite the version of the models last applied is kept in PRAGMA
+    user_version, so booting against an up-to-date database costs one pragma
+    read instead of a check per table and index. Any change to the models
+    changes the version and the DDL runs once more. Returns whether it ran.
+    """
+    if bind.dialect.name != "sqlite":
+        create_schema(bind)
+        return True
+
+    version = schema_version(bind)
+    with bind.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() == version:
+            return False
+
+    create_schema(bind)
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+    logger.info(f"Database schema updated to version {version}")
+    return True
+
+
+# Bounded executors for blocking database work
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+admin_db_executor = ThreadPoolExecutor(max_workers=DB_ADMIN_EXECUTOR_WORKERS, thread_name_prefix="db-admin")
+
+
+async def run_db(fn, *args, admin: bool = False, **kwargs):
+    """Run a blocking database call on the DB executor and await its result"""
+    loop = asyncio.get_running_loop()
+    executor = admin_db_executor if admin else db_executor
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+class AsyncDB:
+    """Request-scoped session whose work runs on the DB executor, off the event loop.
+
+    Pass a function taking the session as its first argument:
+
+        rows = await db.run(lambda session: session.query(models.Registration).all())
+
+    Each run() is its own unit of work: the session is closed in the executor
+    thread before the result is handed back, so a request never holds a pooled
+    connection while it waits on the event loop. Holding one there let queued
+    requests use up the pool while the executor threads waited for connections.
+    """
+
+    def __init__(self, session, admin: bool = False):
+        self.session = session
+        self.admin = admin
+
+    def _run_and_release(self, fn, *args, **kwargs):
+        try:
+            return fn(self.session, *args, **kwargs)
+        finally:
+            self.session.close()
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_db(self._run_and_release, fn, *args, admin=self.admin, **kwargs)
+
+
+async def get_admin_db():
+    """FastAPI dependency for admin read endpoints, served by the admin executor lane"""
+    db = AsyncDB(SessionLocal(), admin=True)
+    try:
+        yield db
+    finally:
+        # Connections are released after every run(), so this does no I/O
+        db.session.close()
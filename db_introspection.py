@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from database import engine
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How long a snapshot is served before the catalogs are read again (seconds)
+DB_INTROSPECTION_TTL = float(os.getenv("DB_INTROSPECTION_TTL", "30"))
+
+# Tables and indexes, with the table each index belongs to and whether a table is virtual
+SCHEMA_QUERY = """
+    SELECT type, name, tbl_name, coalesce(sql LIKE 'CREATE VIRTUAL TABLE%', 0) FROM sqlite_master
+    WHERE type IN ('table', 'index') AND tbl_name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+    ORDER BY tbl_name, type DESC, name
+"""
+
+# One walk over every b-tree page. Each leaf cell of a table b-tree is one
+# row; overflow pages carry no cells, so the sum is an exact row count.
+DBSTAT_QUERY = """
+    SELECT name,
+           count(*) AS pages,
+           sum(pgsize) AS bytes,
+           sum(CASE WHEN pagetype = 'leaf' THEN ncell ELSE 0 END) AS leaf_cells
+    FROM dbstat
+    GROUP BY name
+"""
+
+
+def _pragma(conn, name: str):
+    return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def _analyzed_rows(conn):
+    """Row estimates recorded by the last ANALYZE, keyed by table and index name"""
+    try:
+        rows = conn.exec_driver_sql("SELECT tbl, idx, stat FROM sqlite_stat1").all()
+    except OperationalError:
+        # ANALYZE has never run
+        return {}
+    estimates = {}
+    for table, index, stat in rows:
+        # Every entry starts with the number of rows in the table
+        estimates[table] = estimates[index or table] = int(stat.split()[0])
+    return estimates
+
+
+def _page_stats(conn):
+    """Pages, bytes and leaf cells per table and index, or None without the dbstat table"""
+    try:
+        rows = conn.exec_driver_sql(DBSTAT_QUERY).all()
+    except OperationalError as e:
+        logger.warning(f"dbstat is not available, sizes are not reported: {str(e)}")
+        return None
+    return {name: (pages, size, leaf_cells) for name, pages, size, leaf_cells in rows}
+
+
+def _shadow_owners(conn, virtual_tables, table_names):
+    """Map each shadow table (e.g. lead_search_data of the FTS5 table) to its virtual table"""
+    try:
+        shadow = {name for (name,) in conn.exec_driver_sql(
+            "SELECT name FROM pragma_table_list WHERE schema = 'main' AND type = 'shadow'"
+        )}
+    except OperationalError:
+        # Before SQLite 3.37: shadow tables are the ones named <virtual table>_<suffix>
+        shadow = set(table_names)
+    owners = {}
+    for name in shadow:
+        for parent in virtual_tables:
+            if name.startswith(f"{parent}_"):
+                owners[name] = parent
+    return owners
+
+
+def _add(total, value):
+    return None if total is None or value is None else total + value
+
+
+def introspect(bind=engine):
+    """Read the SQLite catalogs: every table with its rows, pages and indexes, and the file's free pages.
+
+    Virtual tables (the FTS5 search index) report no rows; their pages and
+    bytes are those of their shadow tables, which are listed under them.
+    """
+    with bind.connect() as conn:
+        page_size = _pragma(conn, "page_size")
+        page_count = _pragma(conn, "page_count")
+        freelist_count = _pragma(conn, "freelist_count")
+        schema = conn.exec_driver_sql(SCHEMA_QUERY).all()
+        analyzed = _analyzed_rows(conn)
+        pages = _page_stats(conn)
+        user_version = _pragma(conn, "user_version")
+        virtual_tables = {name for kind, name, _, virtual in schema if virtual}
+        owners = _shadow_owners(conn, virtual_tables, [name for kind, name, _, _ in schema if kind == "table"])
+
+    tables = {}
+    for kind, name, table_name, virtual in schema:
+        table = tables.setdefault(table_name, {"rows": None, "analyzed_rows": None, "pages": None, "bytes": None, "indexes": {}})
+        object_pages, object_bytes, leaf_cells = pages.get(name, (0, 0, 0)) if pages is not None else (None, None, None)
+        if virtual:
+            # Virtual tables have no b-tree of their own; their sizes are those of their shadow tables
+            table.update(virtual=True, pages=0 if pages is not None else None, bytes=0 if pages is not None else None, shadow_tables={})
+        elif kind == "table":
+            table.update(rows=leaf_cells, analyzed_rows=analyzed.get(name), pages=object_pages, bytes=object_bytes)
+        else:
+            table["indexes"][name] = {"pages": object_pages, "bytes": object_bytes, "analyzed_rows": analyzed.get(name)}
+
+    # Fold each shadow table, with its indexes, into its virtual table
+    for name, parent in sorted(owners.items()):
+        shadow = tables.pop(name, None)
+        if shadow is None or parent not in tables:
+            continue
+        shadow_pages, shadow_bytes = shadow["pages"], shadow["bytes"]
+        for index in shadow["indexes"].values():
+            shadow_pages, shadow_bytes = _add(shadow_pages, index["pages"]), _add(shadow_bytes, index["bytes"])
+        owner = tables[parent]
+        owner["shadow_tables"][name] = {"rows": shadow["rows"], "pages": shadow_pages, "bytes": shadow_bytes}
+        owner["pages"], owner["bytes"] = _add(owner["pages"], shadow_pages), _add(owner["bytes"], shadow_bytes)
+
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "database": {
+            "page_size": page_size,
+            "page_count": page_count,
+            "freelist_count": freelist_count,
+            "size_bytes": page_size * page_count,
+            "free_bytes": page_size * freelist_count,
+            "schema_version": user_version
+        },
+        "tables": tables
+    }
+
+
+class DatabaseIntrospection:
+    """Catalog snapshot of the app database, reused for `ttl` seconds.
+
+    Runs on the app engine's pool. Callers arriving while a snapshot is
+    being read wait for it instead of reading the catalogs again, so a burst
+    of health checks costs one walk over the database pages per TTL.
+    """
+
+    def __init__(self, bind=engine, ttl: float = DB_INTROSPECTION_TTL):
+        self.bind = bind
+        self.ttl = ttl
+        self._snapshot = None
+        self._taken_at = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is None or now - self._taken_at >= self.ttl:
+                if self.bind.dialect.name != "sqlite":
+                    raise ValueError(f"Database introspection only supports SQLite, not {self.bind.dialect.name}")
+                self._snapshot = introspect(self.bind)
+                self._taken_at = now = time.monotonic()
+            return dict(self._snapshot, age_seconds=round(now - self._taken_at, 3))
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+# Shared introspection for this process
+database_introspection = DatabaseIntrospection()
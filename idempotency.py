@@ -0,0 +1,199 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
+
+from database import engine, run_db
+from write_coalescer import write_coalescer, after_flush
+import models as models
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How long an Idempotency-Key sent by a client is remembered (seconds)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Requests without a key: one lead per kind and phone number per window (0 disables)
+DUPLICATE_LEAD_WINDOW_SECONDS = int(os.getenv("DUPLICATE_LEAD_WINDOW_SECONDS", "600"))
+# Keys kept in memory in front of the table
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", "300"))
+
+
+# Per-unit statements, run on the batch's connection without ORM overhead
+LOOKUP_KEY = "SELECT lead_id, fingerprint, expires_at FROM idempotency_keys WHERE key = ?"
+DELETE_KEY = "DELETE FROM idempotency_keys WHERE key = ?"
+
+
+def record_keys(session):
+    """Insert the keys claimed by the batch's units, in one statement; the flush has assigned the lead ids"""
+    rows = [
+        {"key": key, "lead_id": lead.id, "fingerprint": fingerprint, "expires_at": expires_at}
+        for key, (lead, fingerprint, expires_at) in session.info["idempotency_keys"].items()
+    ]
+    session.execute(insert(models.IdempotencyKey.__table__), rows)
+
+
+class Replay:
+    """Result of a unit of work whose key was already used, by a committed lead or one earlier in the batch"""
+    __slots__ = ("lead_id", "fingerprint", "lead")
+
+    def __init__(self, lead_id: Optional[int], fingerprint: Optional[str], lead=None):
+        self.lead_id = lead_id
+        self.fingerprint = fingerprint
+        self.lead = lead
+
+
+def fingerprint(payload: BaseModel) -> str:
+    return hashlib.blake2b(payload.model_dump_json().encode(), digest_size=16).hexdigest()
+
+
+def request_key(kind: str, payload: BaseModel, idempotency_key: Optional[str], now: float):
+    """Return (key, fingerprint, expires_at) for a sign-up, or None when it is not deduplicated.
+
+    A client's Idempotency-Key is scoped to the endpoint and remembered for
+    IDEMPOTENCY_TTL_SECONDS; reusing it with a different body is an error.
+    Without one, the phone number and the current DUPLICATE_LEAD_WINDOW_SECONDS
+    window make the key, so a double-click or a retry over a flaky network
+    within the window gets the first lead back.
+    """
+    if idempotency_key:
+        return f"{kind}:key:{idempotency_key}", fingerprint(payload), now + IDEMPOTENCY_TTL_SECONDS
+    if DUPLICATE_LEAD_WINDOW_SECONDS <= 0:
+        return None
+    bucket = int(now // DUPLICATE_LEAD_WINDOW_SECONDS)
+    return f"{kind}:phone:{payload.country_code}{payload.phone}:{bucket}", None, (bucket + 1) * DUPLICATE_LEAD_WINDOW_SECONDS
+
+
+class IdempotencyStore:
+    """Runs each sign-up at most once per idempotency key.
+
+    The key is recorded in the `idempotency_keys` table in the same group
+    commit as the lead, so a lead never exists without its key or the other
+    way round, and the primary key stops two processes from both inserting.
+    Recently used keys are also kept in an LRU, so most retries are answered
+    without touching the database.
+    """
+
+    def __init__(self, capacity: int = IDEMPOTENCY_CACHE_SIZE):
+        self.capacity = capacity
+        self.replayed = 0
+        self.conflicts = 0
+        self._recent = OrderedDict()
+        self._sweeper = None
+
+    def _remember(self, key: str, lead_id: int, fingerprint: Optional[str], expires_at: float):
+        self._recent[key] = (lead_id, fingerprint, expires_at)
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+
+    def _recall(self, key: str, now: float):
+        entry = self._recent.get(key)
+        if entry is not None and entry[2] <= now:
+            del self._recent[key]
+            return None
+        return entry
+
+    def _replay(self, key: str, lead_id: int, stored: Optional[str], sent: Optional[str]) -> int:
+        if stored != sent:
+            self.conflicts += 1
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        self.replayed += 1
+        logger.info(f"Replayed {key} -> lead {lead_id}")
+        return lead_id
+
+    def unit_of_work(self, key: str, fingerprint: Optional[str], expires_at: float, save):
+        """Wrap `save(session)` so it only runs when `key` is unused; returns the lead or a Replay"""
+        def once(session):
+            # Keys claimed by earlier units of this batch are not written yet
+            claimed = session.info.setdefault("idempotency_keys", {})
+            if key in claimed:
+                lead, claimed_fingerprint, _ = claimed[key]
+                return Replay(None, claimed_fingerprint, lead)
+            conn = session.connection()
+            row = conn.exec_driver_sql(LOOKUP_KEY, (key,)).first()
+            if row is not None:
+                if row.expires_at > time.time():
+                    return Replay(row.lead_id, row.fingerprint)
+                conn.exec_driver_sql(DELETE_KEY, (key,))
+
+            lead = save(session)
+            if not claimed:
+                after_flush(session, record_keys)
+            claimed[key] = (lead, fingerprint, expires_at)
+            return lead
+        return once
+
+    async def submit(self, kind: str, payload: BaseModel, idempotency_key: Optional[str], save):
+        """Group-commit `save` unless this sign-up was already made.
+
+        Returns (lead id, lead); the lead is None when an earlier request's id
+        is replayed, in which case nothing was written and no SMS is queued.
+        """
+        now = time.time()
+        request = request_key(kind, payload, idempotency_key, now)
+        if request is None:
+            lead = await write_coalescer.submit(save)
+            return lead.id, lead
+
+        key, sent, expires_at = request
+        entry = self._recall(key, now)
+        if entry is not None:
+            return self._replay(key, entry[0], entry[1], sent), None
+
+        unit = self.unit_of_work(key, sent, expires_at, save)
+        try:
+            result = await write_coalescer.submit(unit)
+        except IntegrityError:
+            # Another process committed the key first; its row is visible now
+            result = await write_coalescer.submit(unit)
+
+        if isinstance(result, Replay):
+            lead_id = result.lead.id if result.lead is not None else result.lead_id
+            self._remember(key, lead_id, result.fingerprint, expires_at)
+            return self._replay(key, lead_id, result.fingerprint, sent), None
+        self._remember(key, result.id, sent, expires_at)
+        return result.id, result
+
+    def sweep(self) -> int:
+        """Delete expired keys from the table"""
+        table = models.IdempotencyKey.__table__
+        with engine.begin() as conn:
+            return conn.execute(delete(table).where(table.c.expires_at <= time.time())).rowcount
+
+    def start_sweeper(self, interval: float = IDEMPOTENCY_SWEEP_INTERVAL):
+        """Sweep expired keys periodically on the running event loop"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval), name="idempotency-sweeper")
+
+    async def stop_sweeper(self):
+        task, self._sweeper = self._sweeper, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _sweep_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await run_db(self.sweep)
+            except Exception as e:
+                logger.error(f"Error sweeping idempotency keys: {str(e)}")
+                continue
+            if removed:
+                logger.info(f"Swept {removed} expired idempotency keys")
+
+    def stats(self):
+        return {"cached_keys": len(self._recent), "replayed": self.replayed, "conflicts": self.conflicts}
+
+
+# Shared idempotency store for the sign-up endpoints
+lead_idempotency = IdempotencyStore()
@@ -0,0 +1,151 @@
+import re
+import logging
+from collections import defaultdict
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+from database import schema_extensions
+import models as models
+from lead_timeline import TIMELINE_TYPES
+from pagination import encode_search_cursor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Words of a query beyond this are ignored
+SEARCH_MAX_TERMS = 8
+
+# Lead type -> code in the search index rowid (id * 4 + code). One index covers
+# the three tables, and each hit maps straight back to its row.
+SEARCH_CODES = {"registration": 1, "enrollment": 2, "masterclass_registration": 3}
+SEARCH_TYPES = {code: type for type, code in SEARCH_CODES.items()}
+
+# Column weights for bm25: a word in the name ranks above the same word in goals
+RANK = "bm25(lead_search, 10.0, 5.0, 5.0, 1.0)"
+
+SEARCH_COLUMNS = "rowid, name, email, phone, goals"
+
+SEARCH_QUERY = f"""
+    SELECT rowid, score FROM (
+        SELECT rowid, {RANK} AS score FROM lead_search WHERE lead_search MATCH :query
+    )
+    WHERE :after_score IS NULL OR (score, rowid) > (:after_score, :after_rowid)
+    ORDER BY score, rowid
+    LIMIT :limit
+"""
+
+
+def _values(prefix: str, model, code: int) -> str:
+    """The lead_search values of one lead row, read through `prefix` (new, old or the table)"""
+    goals = f"{prefix}.goals" if hasattr(model, "goals") else "NULL"
+    return f"{prefix}.id * 4 + {code}, {prefix}.name, {prefix}.email, {prefix}.phone, {goals}"
+
+
+def _search_ddl():
+    """Statements creating the search index and the triggers keeping it in sync, and the backfill"""
+    table = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS lead_search USING fts5("
+        "name, email, phone, goals, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    triggers, backfill = [], []
+    for type, (model, _) in TIMELINE_TYPES.items():
+        name, code = model.__tablename__, SEARCH_CODES[type]
+        columns = "id, name, email, phone" + (", goals" if hasattr(model, "goals") else "")
+        archive = models.ARCHIVE_TABLES[name].name
+        insert = f"INSERT INTO lead_search ({SEARCH_COLUMNS}) VALUES ({_values('new', model, code)});"
+        delete = f"DELETE FROM lead_search WHERE rowid = old.id * 4 + {code};"
+        # A lead moved to the archive (copied there before the delete) stays searchable
+        unless_archived = f"DELETE FROM lead_search WHERE rowid = old.id * 4 + {code} AND NOT EXISTS (SELECT 1 FROM {archive} WHERE id = old.id);"
+        triggers += [
+            (f"{name}_search_insert", f"AFTER INSERT ON {name} BEGIN {insert} END"),
+            (f"{name}_search_delete", f"AFTER DELETE ON {name} BEGIN {unless_archived} END"),
+            (f"{name}_search_update", f"AFTER UPDATE OF {columns} ON {name} BEGIN {delete} {insert} END"),
+        ]
+        backfill += [
+            f"INSERT INTO lead_search ({SEARCH_COLUMNS}) SELECT {_values(source, model, code)} FROM {source}"
+            for source in (name, archive)
+        ]
+    return table, triggers, backfill
+
+
+SEARCH_TABLE_DDL, SEARCH_TRIGGERS, SEARCH_BACKFILL = _search_ddl()
+
+
+def create_search_index(conn):
+    """Create the FTS5 index over the lead tables, filling it from them when it is new.
+
+    The triggers are recreated every time, so a changed trigger replaces the
+    old one. Runs in the schema transaction, so no lead can be written between
+    the backfill and the triggers taking over.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lead_search'").first()
+    conn.exec_driver_sql(SEARCH_TABLE_DDL)
+    for name, body in SEARCH_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+    if not exists:
+        for statement in SEARCH_BACKFILL:
+            conn.exec_driver_sql(statement)
+        logger.info(f"Search index built with {conn.exec_driver_sql('SELECT count(*) FROM lead_search').scalar()} leads")
+
+
+schema_extensions.append((
+    "\n".join([SEARCH_TABLE_DDL] + [f"{name} {body}" for name, body in SEARCH_TRIGGERS]),
+    create_search_index
+))
+
+
+def match_expression(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query in which every word must match, longer ones as a prefix.
+
+    Only the words are kept, each quoted, so FTS5 operators in user input are
+    treated as text. Returns None when there is no word to search for.
+    """
+    terms = re.findall(r"\w+", q)[:SEARCH_MAX_TERMS]
+    return " ".join(f'"{term}"*' if len(term) > 1 else f'"{term}"' for term in terms) or None
+
+
+def search_page(db, query: str, page_size: int, after: Optional[Tuple[float, int]] = None):
+    """Return one page of leads matching `query`, best match first, plus the next cursor.
+
+    Matches come from the FTS5 index ranked by bm25, then from the
+    (score, rowid) of the last hit on the previous page, so later pages do
+    not re-read earlier ones. The leads are then read by primary key, one
+    query per type, and from the archive tables for hits not found there.
+    """
+    after_score, after_rowid = after if after is not None else (None, None)
+    hits = db.execute(text(SEARCH_QUERY), {
+        "query": query,
+        "after_score": after_score,
+        "after_rowid": after_rowid,
+        "limit": page_size + 1
+    }).all()
+
+    next_cursor = None
+    if len(hits) > page_size:
+        hits = hits[:page_size]
+        next_cursor = encode_search_cursor(hits[-1].score, hits[-1].rowid)
+
+    ids = defaultdict(list)
+    for hit in hits:
+        ids[SEARCH_TYPES[hit.rowid % 4]].append(hit.rowid // 4)
+    leads = {}
+    for type, type_ids in ids.items():
+        model, to_dict = TIMELINE_TYPES[type]
+        for row in db.query(model).filter(model.id.in_(type_ids)):
+            leads[(type, row.id)] = dict(to_dict(row), type=type)
+        archived_ids = [id for id in type_ids if (type, id) not in leads]
+        if archived_ids:
+            archive = models.ARCHIVE_TABLES[model.__tablename__]
+            for row in db.query(archive).filter(archive.c.id.in_(archived_ids)):
+                leads[(type, row.id)] = dict(to_dict(row), type=type)
+
+    items = []
+    for hit in hits:
+        lead = leads.get((SEARCH_TYPES[hit.rowid % 4], hit.rowid // 4))
+        if lead is not None:
+            items.append(lead)
+    return items, next_cursor
@@ -0,0 +1,224 @@
+import os
+import logging
+import secrets
+import threading
+from collections import deque
+
+from sqlalchemy import desc, func, select
+
+import models as models
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of recent leads kept per category
+RECENT_LEADS = 5
+# Other worker processes and instances may write the lead tables, and each
+# process only sees its own writes, so by default compare the tables' max ids
+# (three primary key lookups) before serving the summary. SINGLE_WRITER=true
+# skips the check when this process is known to be the only writer.
+SINGLE_WRITER = os.getenv("SINGLE_WRITER", "false").lower() in ("1", "true", "yes")
+SHARED_WRITERS = not SINGLE_WRITER
+
+
+def registration_to_dict(reg):
+    return {
+        "id": reg.id,
+        "name": reg.name,
+        "email": reg.email,
+        "phone": reg.phone,
+        "country_code": reg.country_code,
+        "heard_from": reg.heard_from,
+        "created_at": reg.created_at.isoformat() if reg.created_at else None
+    }
+
+
+def enrollment_to_dict(enroll):
+    return {
+        "id": enroll.id,
+        "name": enroll.name,
+        "email": enroll.email,
+        "phone": enroll.phone,
+        "country_code": enroll.country_code,
+        "current_role": enroll.current_role,
+        "experience": enroll.experience,
+        "programming_experience": enroll.programming_experience,
+        "goals": enroll.goals,
+        "heard_from": enroll.heard_from,
+        "preferred_batch": enroll.preferred_batch,
+        "created_at": enroll.created_at.isoformat() if enroll.created_at else None,
+        "payment_status": enroll.payment_status
+    }
+
+
+def masterclass_to_dict(reg):
+    return {
+        "id": reg.id,
+        "name": reg.name,
+        "email": reg.email,
+        "phone": reg.phone,
+        "country_code": reg.country_code,
+        "created_at": reg.created_at.isoformat() if reg.created_at else None,
+        "attended": reg.attended
+    }
+
+
+# Summary category -> (model, serializer)
+CATEGORIES = {
+    "registrations": (models.Registration, registration_to_dict),
+    "enrollments": (models.Enrollment, enrollment_to_dict),
+    "masterclass_registrations": (models.MasterclassRegistration, masterclass_to_dict),
+}
+
+
+class LeadSummary:
+    """Per-process lead counts and most recent leads for /api/all-leads.
+
+    The write endpoints update it after each commit, so serving the summary is
+    a memory read. It is loaded from the database at startup and again only
+    after invalidate() or when another process wrote.
+
+    It also keeps a write version per category, bumped by every recorded lead
+    and every rebuild, which the response cache uses for its keys and ETags.
+    """
+
+    def __init__(self, recent: int = RECENT_LEADS):
+        self.recent_size = recent
+        self.counts = {}
+        self.recent = {}
+        self.max_ids = {}
+        self.loaded = False
+        # Versions restart at 0 with the process, so ETags also carry the epoch
+        self.epoch = secrets.token_hex(4)
+        self.versions = dict.fromkeys(CATEGORIES, 0)
+        self._lock = threading.Lock()
+        # Held for the whole of a rebuild; _pending collects the leads recorded meanwhile
+        self._rebuilding = threading.Lock()
+        self._pending = None
+
+    def rebuild(self, db):
+        """Reload counts and recent leads from the lead tables and their archives"""
+        with self._rebuilding:
+            self._rebuild(db)
+
+    def _rebuild(self, db):
+        with self._lock:
+            # Leads recorded from here on may or may not be in the snapshot below
+            self._pending = []
+        try:
+            counts, recent, max_ids = self._read(db)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self.counts, self.recent, self.max_ids = counts, recent, max_ids
+            # Ids are assigned in commit order, so the snapshot holds exactly
+            # the leads up to its max id; apply the ones committed after it
+            for category, lead_id, item in sorted(pending, key=lambda lead: lead[1]):
+                if lead_id > (self.max_ids[category] or 0):
+                    self._apply(category, lead_id, item)
+            self.versions = {category: version + 1 for category, version in self.versions.items()}
+            self.loaded = True
+        logger.info(f"Lead summary rebuilt: {counts}")
+
+    def _read(self, db):
+        """Read the counts and max ids in one statement, so they come from one snapshot"""
+        columns = []
+        for category, (model, _) in CATEGORIES.items():
+            # Archived leads are counted from the archive runs' totals, not the archive tables
+            archived = select(func.coalesce(func.sum(models.LeadArchive.rows), 0))\
+                .where(models.LeadArchive.lead_type == category)
+            columns += [
+                select(func.count(model.id)).scalar_subquery(),
+                archived.scalar_subquery(),
+                select(func.max(model.id)).scalar_subquery(),
+            ]
+        row = db.execute(select(*columns)).one()
+
+        counts, recent, max_ids = {}, {}, {}
+        for i, (category, (model, to_dict)) in enumerate(CATEGORIES.items()):
+            hot, archived, max_ids[category] = row[3 * i:3 * i + 3]
+            counts[category] = hot + archived
+            # Leads committed after the snapshot are left to the pending records
+            rows = db.query(model)\
+                .filter(model.id <= (max_ids[category] or 0))\
+                .order_by(desc(model.created_at), desc(model.id))\
+                .limit(self.recent_size)\
+                .all()
+            if len(rows) < self.recent_size and archived:
+                archive = models.ARCHIVE_TABLES[category]
+                rows += db.query(archive)\
+                    .order_by(desc(archive.c.created_at), desc(archive.c.id))\
+                    .limit(self.recent_size - len(rows))\
+                    .all()
+            recent[category] = deque((to_dict(row) for row in rows), maxlen=self.recent_size)
+        return counts, recent, max_ids
+
+    def invalidate(self):
+        """Force a rebuild on the next refresh, e.g. after bulk changes to the lead tables"""
+        with self._lock:
+            self.loaded = False
+
+    def needs_refresh(self) -> bool:
+        """Whether refresh() may have to read the database before the summary can be served"""
+        return not self.loaded or SHARED_WRITERS
+
+    def refresh(self, db):
+        """Rebuild the summary if it was never loaded, invalidated or is stale"""
+        if self.loaded and SHARED_WRITERS:
+            stmt = select(*[select(func.max(model.id)).scalar_subquery() for model, _ in CATEGORIES.values()])
+            current = dict(zip(CATEGORIES, db.execute(stmt).one()))
+            if current != self.max_ids:
+                self.invalidate()
+        if not self.loaded:
+            # Concurrent callers wait for one rebuild instead of each running their own
+            with self._rebuilding:
+                if not self.loaded:
+                    self._rebuild(db)
+
+    def record(self, category: str, lead):
+        """Account for a newly committed lead"""
+        _, to_dict = CATEGORIES[category]
+        item = to_dict(lead)
+        with self._lock:
+            self.versions[category] += 1
+            if self._pending is not None:
+                # A rebuild is running; it applies the lead if its snapshot missed it
+                self._pending.append((category, lead.id, item))
+                return
+            if not self.loaded:
+                return
+            # A gap in the ids means another process (or a concurrent request
+            # committing out of order) wrote a lead we have not seen
+            if lead.id != (self.max_ids[category] or 0) + 1:
+                self.loaded = False
+                return
+            self._apply(category, lead.id, item)
+
+    def _apply(self, category: str, lead_id: int, item: dict):
+        self.counts[category] += 1
+        self.max_ids[category] = lead_id
+        # The ring buffer drops its oldest lead
+        self.recent[category].appendleft(item)
+
+    def version(self, *categories):
+        """Return the write versions of `categories`; any new lead in them changes the result"""
+        with self._lock:
+            return tuple(self.versions[category] for category in categories)
+
+    def count(self, category: str) -> int:
+        """Return the number of leads in one category"""
+        with self._lock:
+            return self.counts[category]
+
+    def snapshot(self):
+        """Return copies of the counts and recent leads"""
+        with self._lock:
+            return dict(self.counts), {category: list(items) for category, items in self.recent.items()}
+
+
+# Shared summary for this process
+lead_summary = LeadSummary()
@@ -0,0 +1,69 @@
+import heapq
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import desc, tuple_
+
+import models as models
+from lead_summary import registration_to_dict, enrollment_to_dict, masterclass_to_dict
+from pagination import encode_timeline_cursor
+
+# Timeline type -> (model, serializer). Leads created at the same instant are
+# ordered by their position in this list, then by id.
+TIMELINE_TYPES = {
+    "registration": (models.Registration, registration_to_dict),
+    "enrollment": (models.Enrollment, enrollment_to_dict),
+    "masterclass_registration": (models.MasterclassRegistration, masterclass_to_dict),
+}
+RANKS = {type: rank for rank, type in enumerate(TIMELINE_TYPES)}
+
+
+def _after(model, type: str, cursor: Tuple[datetime, str, int]):
+    """Filter selecting the rows of `model` that come after the cursor lead (newest first)"""
+    created_at, cursor_type, id = cursor
+    if RANKS[type] < RANKS[cursor_type]:
+        return model.created_at <= created_at
+    if type == cursor_type:
+        return tuple_(model.created_at, model.id) < tuple_(created_at, id)
+    return model.created_at < created_at
+
+
+def _newest(query, columns, type: str, after, limit: int):
+    """The first `limit` rows of `query` after the cursor lead, newest first, on the (created_at, id) index"""
+    if after is not None:
+        query = query.filter(_after(columns, type, after))
+    return query.order_by(desc(columns.created_at), desc(columns.id)).limit(limit).all()
+
+
+def timeline_page(db, page_size: int, after: Optional[Tuple[datetime, str, int]] = None):
+    """Return one page of all leads, newest first, plus the next cursor.
+
+    Each table is read with its own keyset query on the (created_at, id)
+    index, limited to one page, and the three sorted runs are merged in
+    memory. The cost of a page is three index range reads whatever its depth,
+    plus one in each archive table whose live rows ran out.
+    """
+    runs = []
+    for type, (model, _) in TIMELINE_TYPES.items():
+        rows = _newest(db.query(model), model, type, after, page_size + 1)
+        # Archived leads are older than the table's, so a run that ends early continues in the archive
+        if len(rows) <= page_size:
+            archive = models.ARCHIVE_TABLES[model.__tablename__]
+            last = (rows[-1].created_at, type, rows[-1].id) if rows else after
+            rows += _newest(db.query(archive), archive.c, type, last, page_size + 1 - len(rows))
+        runs.append([(row.created_at, RANKS[type], row.id, type, row) for row in rows])
+
+    merged = heapq.merge(*runs, key=lambda item: item[:3], reverse=True)
+    page = [item for _, item in zip(range(page_size + 1), merged)]
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        created_at, _, id, type, _ = page[-1]
+        next_cursor = encode_timeline_cursor(created_at, type, id)
+
+    items = []
+    for _, _, _, type, row in page:
+        _, to_dict = TIMELINE_TYPES[type]
+        items.append(dict(to_dict(row), type=type))
+    return items, next_cursor
@@ -1,34 +1,86 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, File, UploadFile, Form, Request,Query
-from fastapi.responses import JSONResponse, FileResponse
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, File, UploadFile, Form, Request,Query, Response, Header
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 from typing import Optional
 import random
 import string
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import logging
-from sqlalchemy import desc
+from sqlalchemy import text
 import math
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load environment variables before the local modules read their settings
+load_dotenv()
+
 # Import local modules
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine, ensure_schema, AsyncDB, get_admin_db, run_db
 import models as models
 import schemas as schemas
-from twilio_service import send_otp, send_sms_to_owner
+from twilio_service import send_otp, close_transport
+from otp_store import create_otp_store, OTP_MISSING, OTP_EXPIRED, OTP_INVALID
+from rate_limit import check_otp_rate_limit, rate_limit_stats
+from pagination import keyset_page, decode_cursor, decode_timeline_cursor, decode_search_cursor
+from lead_summary import lead_summary
+from lead_timeline import timeline_page, TIMELINE_TYPES
+from lead_search import search_page, match_expression
+from analytics import lead_analytics, GROUP_BY, ROLLUP_DIMENSIONS
+from serialization import item_columns, PageEncoder
+from response_cache import response_cache
+from static_assets import StaticAsset
+from metrics import MetricsMiddleware, instrument_engine, render_metrics
+from profiler import ProfilerMiddleware, PROFILE_SAMPLE_RATE, PROFILE_TOKEN
+from lead_export import stream_export, EXPORT_MODELS, EXPORT_FORMATS
+from write_coalescer import write_coalescer
+from idempotency import lead_idempotency
+from archive import lead_archiver
+from db_introspection import database_introspection
+from outbox import enqueue_owner_sms, dispatcher as outbox_dispatcher, outbox_stats
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Time every SQL statement for /metrics
+instrument_engine(engine)
 
-# Load environment variables
-load_dotenv()
+async def warm_caches():
+    """Load the lead summary and hash the curriculum PDF; both also load on first use.
+
+    Requests that need the summary wait for this rebuild rather than starting
+    their own, and sign-ups committed while it runs are applied once it has
+    installed its snapshot (see LeadSummary.rebuild).
+    """
+    try:
+        await AsyncDB(SessionLocal(), admin=True).run(lead_summary.refresh)
+        await curriculum_pdf.current()
+    except Exception as e:
+        logger.error(f"Error warming caches: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables and indexes, unless the database is already at this schema version
+    await run_db(ensure_schema)
+    await outbox_dispatcher.start()
+    otp_store.start_sweeper()
+    lead_idempotency.start_sweeper()
+    # Warm up after the server starts accepting requests, so it does not delay the first one
+    app.state.warmup = asyncio.create_task(warm_caches())
+    # Move leads older than ARCHIVE_AFTER_DAYS out of the lead tables, in the background
+    lead_archiver.start()
+    yield
+    app.state.warmup.cancel()
+    await lead_archiver.stop()
+    await write_coalescer.drain()
+    await outbox_dispatcher.stop()
+    await otp_store.stop_sweeper()
+    await lead_idempotency.stop_sweeper()
+    await close_transport()
 
-app = FastAPI(title="RByte.ai API", description="Backend API for RByte.ai AI Engineering Course")
+app = FastAPI(title="RByte.ai API", description="Backend API for RByte.ai AI Engineering Course", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -40,23 +92,34 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Per-route latency and status counts for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in sampling profiler; not installed at all unless PROFILE_SAMPLE_RATE or PROFILE_TOKEN is set
+if PROFILE_SAMPLE_RATE > 0 or PROFILE_TOKEN:
+    app.add_middleware(ProfilerMiddleware)
+
+# OTP storage with TTL expiry and a hard capacity (in-memory, or shared by all workers)
+otp_store = create_otp_store()
 
-# In-memory OTP storage (in production, use Redis or another persistent store)
-otp_store = {}
+# Curriculum PDF, stat'ed and hashed once instead of on every download
+curriculum_pdf = StaticAsset(
+    "static/RByte.ai – AI Engineering Professional Program (3).pdf",
+    media_type="application/pdf",
+    filename="RByte.ai_AI_Engineering_Curriculum.pdf"
+)
+
+# Compiled JSON encoders for the listing pages
+registration_page = PageEncoder(schemas.RegistrationItem)
+enrollment_page = PageEncoder(schemas.EnrollmentItem)
+masterclass_page = PageEncoder(schemas.MasterclassRegistrationItem)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to RByte.ai API"}
 
 @app.post("/api/send-otp", response_model=schemas.OTPResponse)
-async def send_otp_endpoint(phone_data: schemas.PhoneNumber):
+async def send_otp_endpoint(phone_data: schemas.PhoneNumber, request: Request):
     """Send OTP to the provided phone number using Twilio"""
     phone = phone_data.phone
     country_code = phone_data.country_code
@@ -64,18 +127,18 @@ async def send_otp_endpoint(phone_data: schemas.PhoneNumber):
     # Format phone number for Twilio
     formatted_phone = f"{country_code}{phone}"
     
+    # Turn floods away before they cost a Twilio round trip
+    check_otp_rate_limit(request, formatted_phone)
+    
     # Generate a 6-digit OTP
     otp = ''.join(random.choices(string.digits, k=6))
     
     try:
         # Send the randomly generated OTP via Twilio
-        send_otp(formatted_phone, otp)
+        await send_otp(formatted_phone, otp)
         
         # Store OTP with expiration time (5 minutes)
-        otp_store[formatted_phone] = {
-            "otp": otp,
-            "expires_at": datetime.now() + timedelta(minutes=5)
-        }
+        await otp_store.aput(formatted_phone, otp)
         
         logger.info(f"OTP sent to {formatted_phone}: {otp}")
         return {"success": True, "message": "OTP sent successfully"}
@@ -92,139 +155,147 @@ async def verify_otp_endpoint(verification_data: schemas.OTPVerification):
     formatted_phone = f"{country_code}{phone}"
     logger.info(f"Verifying OTP for phone: {formatted_phone}")
     
-    # Check if OTP exists and is valid
-    if formatted_phone not in otp_store:
+    # Check the OTP; it is consumed once it is verified or found expired
+    result = await otp_store.averify(formatted_phone, otp_code)
+    
+    if result == OTP_MISSING:
         logger.warning(f"No OTP found for phone: {formatted_phone}")
         raise HTTPException(status_code=400, detail="No OTP was sent to this number")
     
-    stored_otp = otp_store[formatted_phone]
-    
-    # Check if OTP has expired
-    if datetime.now() > stored_otp["expires_at"]:
+    if result == OTP_EXPIRED:
         logger.warning(f"OTP expired for phone: {formatted_phone}")
-        del otp_store[formatted_phone]
         raise HTTPException(status_code=400, detail="OTP has expired")
     
-    # Verify OTP
-    if stored_otp["otp"] != otp_code:
+    if result == OTP_INVALID:
         logger.warning(f"Invalid OTP for phone: {formatted_phone}")
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
-    # Clear the OTP after successful verification
     logger.info(f"OTP verified successfully for phone: {formatted_phone}")
-    del otp_store[formatted_phone]
     
     return {"success": True, "message": "OTP verified successfully"}
 
 @app.post("/api/register", response_model=schemas.RegistrationResponse)
-async def register_user(
-    registration: schemas.Registration,
-    db: Session = Depends(get_db)
-):
+async def register_user(registration: schemas.Registration, response: Response, idempotency_key: Optional[str] = Header(None, max_length=200)):
     """Register a new user interested in the course"""
-    # Create new registration record
-    db_registration = models.Registration(
-        name=registration.name,
-        email=registration.email,
-        phone=registration.phone,
-        country_code=registration.country_code,
-        heard_from=registration.heard_from,
-        created_at=datetime.now()
-    )
+    def save(session):
+        # Create new registration record
+        db_registration = models.Registration(
+            name=registration.name,
+            email=registration.email,
+            phone=registration.phone,
+            country_code=registration.country_code,
+            heard_from=registration.heard_from,
+            created_at=datetime.now()
+        )
+        
+        session.add(db_registration)
+        enqueue_owner_sms(session, registration.name, registration.phone, registration.email)
+        return db_registration
     
-    db.add(db_registration)
-    db.commit()
-    db.refresh(db_registration)
-    send_sms_to_owner(registration.name, registration.phone, registration.email)
+    # The insert and the outbox row are group-committed with concurrent sign-ups.
+    # A retry of the same sign-up gets the first one's id without a new row or SMS.
+    lead_id, db_registration = await lead_idempotency.submit("registrations", registration, idempotency_key, save)
+    if db_registration is None:
+        response.headers["Idempotent-Replayed"] = "true"
+    else:
+        outbox_dispatcher.notify()
+        lead_summary.record("registrations", db_registration)
     
-    return {"success": True, "message": "Registration successful", "id": db_registration.id}
+    return {"success": True, "message": "Registration successful", "id": lead_id}
 
 @app.post("/api/enroll", response_model=schemas.EnrollmentResponse)
-async def enroll_user(
-    enrollment: schemas.Enrollment,
-    db: Session = Depends(get_db)
-):
+async def enroll_user(enrollment: schemas.Enrollment, response: Response, idempotency_key: Optional[str] = Header(None, max_length=200)):
     """Enroll a user in the AI Engineering course"""
-    # Create new enrollment record
-    db_enrollment = models.Enrollment(
-        name=enrollment.name,
-        email=enrollment.email,
-        phone=enrollment.phone,
-        country_code=enrollment.country_code,
-        current_role=enrollment.current_role,
-        experience=enrollment.experience,
-        programming_experience=enrollment.programming_experience,
-        goals=enrollment.goals,
-        heard_from=enrollment.heard_from,
-        preferred_batch=enrollment.preferred_batch,
-        created_at=datetime.now()
-    )
+    def save(session):
+        # Create new enrollment record
+        db_enrollment = models.Enrollment(
+            name=enrollment.name,
+            email=enrollment.email,
+            phone=enrollment.phone,
+            country_code=enrollment.country_code,
+            current_role=enrollment.current_role,
+            experience=enrollment.experience,
+            programming_experience=enrollment.programming_experience,
+            goals=enrollment.goals,
+            heard_from=enrollment.heard_from,
+            preferred_batch=enrollment.preferred_batch,
+            created_at=datetime.now()
+        )
+        
+        session.add(db_enrollment)
+        enqueue_owner_sms(session, enrollment.name, enrollment.phone, enrollment.email)
+        return db_enrollment
     
-    db.add(db_enrollment)
-    db.commit()
-    db.refresh(db_enrollment)
-    send_sms_to_owner(enrollment.name, enrollment.phone, enrollment.email)
-
+    # The insert and the outbox row are group-committed with concurrent sign-ups.
+    # A retry of the same sign-up gets the first one's id without a new row or SMS.
+    lead_id, db_enrollment = await lead_idempotency.submit("enrollments", enrollment, idempotency_key, save)
+    if db_enrollment is None:
+        response.headers["Idempotent-Replayed"] = "true"
+    else:
+        outbox_dispatcher.notify()
+        lead_summary.record("enrollments", db_enrollment)
     
-    return {"success": True, "message": "Enrollment successful", "id": db_enrollment.id}
+    return {"success": True, "message": "Enrollment successful", "id": lead_id}
 
 @app.get("/api/curriculum", response_class=FileResponse)
-async def get_curriculum():
+async def get_curriculum(request: Request):
     """Return the curriculum PDF"""
-    # Path to the PDF file and make more secure
-    pdf_path = "static/RByte.ai – AI Engineering Professional Program (3).pdf"
+    # Validators are precomputed; Range, If-None-Match and If-Modified-Since are honoured
+    response = await curriculum_pdf.response(request)
     
     # Check if file exists
-    if not os.path.isfile(pdf_path):
+    if response is None:
         raise HTTPException(status_code=404, detail="Curriculum PDF not found")
     
-    # Return the PDF file
-    return FileResponse(
-        pdf_path, 
-        media_type="application/pdf",
-        filename="RByte.ai_AI_Engineering_Curriculum.pdf"
-    )
+    return response
 
 @app.post("/api/masterclass-register", response_model=schemas.MasterclassResponse)
-async def register_for_masterclass(
-    masterclass: schemas.MasterclassRegistration,
-    db: Session = Depends(get_db)
-):
+async def register_for_masterclass(masterclass: schemas.MasterclassRegistration, response: Response, idempotency_key: Optional[str] = Header(None, max_length=200)):
     """Register a user for the free masterclass"""
-    # Create new masterclass registration record
-    db_masterclass = models.MasterclassRegistration(
-        name=masterclass.name,
-        phone=masterclass.phone,
-        country_code=masterclass.country_code,
-        email=masterclass.email,
-        created_at=datetime.now()
-    )
+    def save(session):
+        # Create new masterclass registration record
+        db_masterclass = models.MasterclassRegistration(
+            name=masterclass.name,
+            phone=masterclass.phone,
+            country_code=masterclass.country_code,
+            email=masterclass.email,
+            created_at=datetime.now()
+        )
+        
+        session.add(db_masterclass)
+        enqueue_owner_sms(session, masterclass.name, masterclass.phone, masterclass.email)
+        return db_masterclass
     
-    db.add(db_masterclass)
-    db.commit()
-    db.refresh(db_masterclass)
-    send_sms_to_owner(masterclass.name, masterclass.phone, masterclass.email)
+    # The insert and the outbox row are group-committed with concurrent sign-ups.
+    # A retry of the same sign-up gets the first one's id without a new row or SMS.
+    lead_id, db_masterclass = await lead_idempotency.submit("masterclass_registrations", masterclass, idempotency_key, save)
+    if db_masterclass is None:
+        response.headers["Idempotent-Replayed"] = "true"
+    else:
+        outbox_dispatcher.notify()
+        lead_summary.record("masterclass_registrations", db_masterclass)
     
-    return {"success": True, "message": "Masterclass registration successful", "id": db_masterclass.id}
+    return {"success": True, "message": "Masterclass registration successful", "id": lead_id}
 
 @app.get("/api/test-otp/{phone}")
-async def test_otp(phone: str, country_code: str = "+91"):
+async def test_otp(phone: str, request: Request, country_code: str = "+91"):
     """Test endpoint to send an OTP to a specific phone number"""
+    formatted_phone = f"{country_code}{phone}"
+    
+    # Turn floods away before they cost a Twilio round trip
+    check_otp_rate_limit(request, formatted_phone)
+    
     try:
-        formatted_phone = f"{country_code}{phone}"
         logger.info(f"Test sending OTP to: {formatted_phone}")
         
         # Generate a random 6-digit OTP for testing
         test_otp = ''.join(random.choices(string.digits, k=6))
         
         # Send the OTP
-        message_sid = send_otp(formatted_phone, test_otp)
+        message_sid = await send_otp(formatted_phone, test_otp)
         
         # Store OTP with expiration time (5 minutes)
-        otp_store[formatted_phone] = {
-            "otp": test_otp,
-            "expires_at": datetime.now() + timedelta(minutes=5)
-        }
+        await otp_store.aput(formatted_phone, test_otp)
         
         logger.info(f"Test OTP sent to {formatted_phone}: {test_otp}")
         return {
@@ -237,6 +308,11 @@ async def test_otp(phone: str, country_code: str = "+91"):
         logger.error(f"Error in test OTP: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send test OTP: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: route, SQL statement and outbound SMS latency histograms"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/debug/status")
 async def debug_status():
     """Debug endpoint to check server status and configuration"""
@@ -250,16 +326,19 @@ async def debug_status():
         }
         
         # Check database connection
-        db = SessionLocal()
-        db_connected = True
-        try:
-            # Try a simple query
-            db.execute("SELECT 1")
-        except Exception as e:
-            db_connected = False
-            db_error = str(e)
-        finally:
-            db.close()
+        def check_database():
+            db = SessionLocal()
+            try:
+                # Try a simple query
+                db.execute(text("SELECT 1"))
+                return True, None
+            except Exception as e:
+                return False, str(e)
+            finally:
+                db.close()
+        
+        db_connected, db_error = await run_db(check_database, admin=True)
+        otp_stats = await otp_store.astats()
         
         return {
             "status": "ok",
@@ -268,9 +347,16 @@ async def debug_status():
             "twilio_config": twilio_config,
             "database": {
                 "connected": db_connected,
-                "error": db_error if not db_connected else None
+                "error": db_error
             },
-            "otp_store_size": len(otp_store)
+            "otp_store_size": otp_stats["size"],
+            "otp_store": otp_stats,
+            "sms_outbox": await run_db(outbox_stats, admin=True) if db_connected else None,
+            "rate_limits": rate_limit_stats(),
+            "write_coalescer": write_coalescer.stats(),
+            "idempotency": lead_idempotency.stats(),
+            "archive": lead_archiver.stats(),
+            "response_cache": response_cache.stats()
         }
     except Exception as e:
         logger.error(f"Error in debug status endpoint: {str(e)}")
@@ -281,26 +367,48 @@ async def debug_status():
         }
     
 # New endpoints to fetch all registrations, enrollments, and masterclass registrations
-@app.get("/api/registrations", response_model=schemas.PaginatedResponse)
+@app.get("/api/registrations", response_model=schemas.PaginatedResponse[schemas.RegistrationItem])
 async def get_all_registrations(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncDB = Depends(get_admin_db)
 ):
     """Get all course registrations with pagination"""
+    # Decode the keyset cursor before touching the database
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Repeat polls are answered from the response cache, or with a 304
+    cache_key = await response_cache.key(request, db, "registrations")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         # Calculate offset
         offset = (page - 1) * page_size
         
-        # Get total count
-        total = db.query(models.Registration).count()
+        # Count and page are read on the admin DB executor, off the event loop
+        def load_page(session):
+            # Get total count from the lead summary (refreshed for the cache key) instead of a COUNT(*) scan
+            total = lead_summary.count("registrations")
         
-        # Get registrations with pagination
-        registrations = db.query(models.Registration)\
-            .order_by(desc(models.Registration.created_at))\
-            .offset(offset)\
-            .limit(page_size)\
-            .all()
+            # Get registrations with keyset pagination; offset only applies to page numbers without a cursor
+            registrations, next_cursor = keyset_page(
+                session.query(*item_columns(models.Registration, schemas.RegistrationItem)),
+                models.Registration,
+                page_size,
+                after=after,
+                offset=0 if after else offset,
+                archive=models.ARCHIVE_TABLES[models.Registration.__tablename__]
+            )
+            return total, registrations, next_cursor
+        
+        total, registrations, next_cursor = await db.run(load_page)
         
         # Log the query results
         logger.info(f"Registrations query returned {len(registrations)} results")
@@ -309,50 +417,61 @@ async def get_all_registrations(
         # Calculate total pages
         total_pages = math.ceil(total / page_size) if total > 0 else 0
 
-        # If requested page is greater than total pages and total pages is not zero, return first page
-        if page > total_pages and total_pages > 0:
-            page = 1
-            offset = 0
-            registrations = db.query(models.Registration)\
-                .order_by(desc(models.Registration.created_at))\
-                .offset(offset)\
-                .limit(page_size)\
-                .all()
-        
-        # Convert to Pydantic models - using model_validate instead of from_orm
-        registration_items = [schemas.RegistrationItem.model_validate(reg) for reg in registrations]
-        
-        return {
-            "items": registration_items,
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "total_pages": total_pages
-        }
+        # Rows are projected tuples, validated and dumped to JSON by the compiled encoder
+        return response_cache.store(cache_key, registration_page.response(
+            items=registrations,
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages,
+            next_cursor=next_cursor
+        ))
     except Exception as e:
         logger.error(f"Error fetching registrations: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch registrations: {str(e)}")
 
-@app.get("/api/enrollments", response_model=schemas.PaginatedResponse)
+@app.get("/api/enrollments", response_model=schemas.PaginatedResponse[schemas.EnrollmentItem])
 async def get_all_enrollments(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncDB = Depends(get_admin_db)
 ):
     """Get all course enrollments with pagination"""
+    # Decode the keyset cursor before touching the database
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Repeat polls are answered from the response cache, or with a 304
+    cache_key = await response_cache.key(request, db, "enrollments")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         # Calculate offset
         offset = (page - 1) * page_size
         
-        # Get total count
-        total = db.query(models.Enrollment).count()
+        # Count and page are read on the admin DB executor, off the event loop
+        def load_page(session):
+            # Get total count from the lead summary (refreshed for the cache key) instead of a COUNT(*) scan
+            total = lead_summary.count("enrollments")
+        
+            # Get enrollments with keyset pagination; offset only applies to page numbers without a cursor
+            enrollments, next_cursor = keyset_page(
+                session.query(*item_columns(models.Enrollment, schemas.EnrollmentItem)),
+                models.Enrollment,
+                page_size,
+                after=after,
+                offset=0 if after else offset,
+                archive=models.ARCHIVE_TABLES[models.Enrollment.__tablename__]
+            )
+            return total, enrollments, next_cursor
         
-        # Get enrollments with pagination
-        enrollments = db.query(models.Enrollment)\
-            .order_by(desc(models.Enrollment.created_at))\
-            .offset(offset)\
-            .limit(page_size)\
-            .all()
+        total, enrollments, next_cursor = await db.run(load_page)
         
         # Log the query results
         logger.info(f"Enrollments query returned {len(enrollments)} results")
@@ -361,50 +480,61 @@ async def get_all_enrollments(
         # Calculate total pages
         total_pages = math.ceil(total / page_size) if total > 0 else 0
 
-        # If requested page is greater than total pages and total pages is not zero, return first page
-        if page > total_pages and total_pages > 0:
-            page = 1
-            offset = 0
-            enrollments = db.query(models.Enrollment)\
-                .order_by(desc(models.Enrollment.created_at))\
-                .offset(offset)\
-                .limit(page_size)\
-                .all()
-        
-        # Convert to Pydantic models - using model_validate instead of from_orm
-        enrollment_items = [schemas.EnrollmentItem.model_validate(enroll) for enroll in enrollments]
-        
-        return {
-            "items": enrollment_items,
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "total_pages": total_pages
-        }
+        # Rows are projected tuples, validated and dumped to JSON by the compiled encoder
+        return response_cache.store(cache_key, enrollment_page.response(
+            items=enrollments,
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages,
+            next_cursor=next_cursor
+        ))
     except Exception as e:
         logger.error(f"Error fetching enrollments: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch enrollments: {str(e)}")
 
-@app.get("/api/masterclass-registrations", response_model=schemas.PaginatedResponse)
+@app.get("/api/masterclass-registrations", response_model=schemas.PaginatedResponse[schemas.MasterclassRegistrationItem])
 async def get_all_masterclass_registrations(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncDB = Depends(get_admin_db)
 ):
     """Get all masterclass registrations with pagination"""
+    # Decode the keyset cursor before touching the database
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Repeat polls are answered from the response cache, or with a 304
+    cache_key = await response_cache.key(request, db, "masterclass_registrations")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         # Calculate offset
         offset = (page - 1) * page_size
         
-        # Get total count
-        total = db.query(models.MasterclassRegistration).count()
+        # Count and page are read on the admin DB executor, off the event loop
+        def load_page(session):
+            # Get total count from the lead summary (refreshed for the cache key) instead of a COUNT(*) scan
+            total = lead_summary.count("masterclass_registrations")
         
-        # Get masterclass registrations with pagination
-        masterclass_registrations = db.query(models.MasterclassRegistration)\
-            .order_by(desc(models.MasterclassRegistration.created_at))\
-            .offset(offset)\
-            .limit(page_size)\
-            .all()
+            # Get masterclass registrations with keyset pagination; offset only applies to page numbers without a cursor
+            masterclass_registrations, next_cursor = keyset_page(
+                session.query(*item_columns(models.MasterclassRegistration, schemas.MasterclassRegistrationItem)),
+                models.MasterclassRegistration,
+                page_size,
+                after=after,
+                offset=0 if after else offset,
+                archive=models.ARCHIVE_TABLES[models.MasterclassRegistration.__tablename__]
+            )
+            return total, masterclass_registrations, next_cursor
+        
+        total, masterclass_registrations, next_cursor = await db.run(load_page)
         
         # Log the query results
         logger.info(f"MasterclassRegistrations query returned {len(masterclass_registrations)} results")
@@ -413,126 +543,185 @@ async def get_all_masterclass_registrations(
         # Calculate total pages
         total_pages = math.ceil(total / page_size) if total > 0 else 0
 
-        # If requested page is greater than total pages and total pages is not zero, return first page
-        if page > total_pages and total_pages > 0:
-            page = 1
-            offset = 0
-            masterclass_registrations = db.query(models.MasterclassRegistration)\
-                .order_by(desc(models.MasterclassRegistration.created_at))\
-                .offset(offset)\
-                .limit(page_size)\
-                .all()
-        
-        # Convert to Pydantic models - using model_validate instead of from_orm
-        masterclass_items = [schemas.MasterclassRegistrationItem.model_validate(reg) for reg in masterclass_registrations]
-        
-        return {
-            "items": masterclass_items,
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "total_pages": total_pages
-        }
+        # Rows are projected tuples, validated and dumped to JSON by the compiled encoder
+        return response_cache.store(cache_key, masterclass_page.response(
+            items=masterclass_registrations,
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages,
+            next_cursor=next_cursor
+        ))
     except Exception as e:
         logger.error(f"Error fetching masterclass registrations: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch masterclass registrations: {str(e)}")
 
 @app.get("/api/all-leads")
 async def get_all_leads(
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncDB = Depends(get_admin_db)
 ):
     """Get all leads (registrations, enrollments, and masterclass registrations)"""
+    # Repeat polls are answered from the response cache, or with a 304
+    cache_key = await response_cache.key(request, db, "registrations", "enrollments", "masterclass_registrations")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        # Get counts
-        registrations_count = db.query(models.Registration).count()
-        enrollments_count = db.query(models.Enrollment).count()
-        masterclass_count = db.query(models.MasterclassRegistration).count()
-        
-        # Get the most recent leads from each category
-        recent_registrations = db.query(models.Registration)\
-            .order_by(desc(models.Registration.created_at))\
-            .limit(5)\
-            .all()
-        
-        recent_enrollments = db.query(models.Enrollment)\
-            .order_by(desc(models.Enrollment.created_at))\
-            .limit(5)\
-            .all()
-        
-        recent_masterclass = db.query(models.MasterclassRegistration)\
-            .order_by(desc(models.MasterclassRegistration.created_at))\
-            .limit(5)\
-            .all()
-        
-        # Convert to dictionaries manually instead of using Pydantic models
-        registration_items = []
-        for reg in recent_registrations:
-            registration_items.append({
-                "id": reg.id,
-                "name": reg.name,
-                "email": reg.email,
-                "phone": reg.phone,
-                "country_code": reg.country_code,
-                "heard_from": reg.heard_from,
-                "created_at": reg.created_at.isoformat() if reg.created_at else None
-            })
-        
-        enrollment_items = []
-        for enroll in recent_enrollments:
-            enrollment_items.append({
-                "id": enroll.id,
-                "name": enroll.name,
-                "email": enroll.email,
-                "phone": enroll.phone,
-                "country_code": enroll.country_code,
-                "current_role": enroll.current_role,
-                "experience": enroll.experience,
-                "programming_experience": enroll.programming_experience,
-                "goals": enroll.goals,
-                "heard_from": enroll.heard_from,
-                "preferred_batch": enroll.preferred_batch,
-                "created_at": enroll.created_at.isoformat() if enroll.created_at else None,
-                "payment_status": enroll.payment_status
-            })
-        
-        masterclass_items = []
-        for reg in recent_masterclass:
-            masterclass_items.append({
-                "id": reg.id,
-                "name": reg.name,
-                "email": reg.email,
-                "phone": reg.phone,
-                "country_code": reg.country_code,
-                "created_at": reg.created_at.isoformat() if reg.created_at else None,
-                "attended": reg.attended
-            })
-        
-        return {
+        # Counts and recent leads come from the in-process summary (refreshed for the cache key)
+        counts, recent_leads = lead_summary.snapshot()
+        registrations_count = counts["registrations"]
+        enrollments_count = counts["enrollments"]
+        masterclass_count = counts["masterclass_registrations"]
+        
+        # The timestamp is when this summary was built; cached copies keep it
+        return response_cache.store(cache_key, JSONResponse({
             "counts": {
                 "registrations": registrations_count,
                 "enrollments": enrollments_count,
                 "masterclass_registrations": masterclass_count,
                 "total_leads": registrations_count + enrollments_count + masterclass_count
             },
-            "recent_leads": {
-                "registrations": registration_items,
-                "enrollments": enrollment_items,
-                "masterclass_registrations": masterclass_items
-            },
+            "recent_leads": recent_leads,
             "timestamp": datetime.now().isoformat()
-        }
+        }))
     except Exception as e:
         logger.error(f"Error fetching all leads: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch all leads: {str(e)}")
 
+@app.get("/api/leads/timeline", response_model=schemas.TimelineResponse)
+async def get_leads_timeline(
+    request: Request,
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncDB = Depends(get_admin_db)
+):
+    """Get registrations, enrollments and masterclass registrations as one feed, newest first"""
+    # Decode the keyset cursor before touching the database
+    try:
+        after = decode_timeline_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if after is not None and after[1] not in TIMELINE_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Repeat polls are answered from the response cache, or with a 304
+    cache_key = await response_cache.key(request, db, "registrations", "enrollments", "masterclass_registrations")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        def load_page(session):
+            counts, _ = lead_summary.snapshot()
+            items, next_cursor = timeline_page(session, page_size, after=after)
+            return sum(counts.values()), items, next_cursor
+
+        total, items, next_cursor = await db.run(load_page)
+
+        return response_cache.store(cache_key, JSONResponse({
+            "items": items,
+            "total": total,
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        }))
+    except Exception as e:
+        logger.error(f"Error fetching lead timeline: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch lead timeline: {str(e)}")
+
+@app.get("/api/leads/search", response_model=schemas.SearchResponse)
+async def search_leads(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words of a name, email, phone number or enrollment goals"),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncDB = Depends(get_admin_db)
+):
+    """Search registrations, enrollments and masterclass registrations, best matches first"""
+    query = match_expression(q)
+    if query is None:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    try:
+        after = decode_search_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Repeated searches are answered from the response cache until a new lead arrives
+    cache_key = await response_cache.key(request, db, "registrations", "enrollments", "masterclass_registrations")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        items, next_cursor = await db.run(search_page, query, page_size, after)
+        return response_cache.store(cache_key, JSONResponse({
+            "items": items,
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        }))
+    except Exception as e:
+        logger.error(f"Error searching leads: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to search leads: {str(e)}")
+
+@app.get("/api/analytics/leads")
+async def get_lead_analytics(
+    request: Request,
+    group_by: str = Query("day", pattern=f"^({'|'.join(GROUP_BY)})$", description="day, or a lead attribute to count by"),
+    since: Optional[date] = Query(None, description="First day counted"),
+    until: Optional[date] = Query(None, description="Day after the last one counted"),
+    lead_type: Optional[str] = Query(None, pattern=f"^({'|'.join(ROLLUP_DIMENSIONS)})$"),
+    daily: bool = Query(False, description="Split the counts of an attribute by day"),
+    db: AsyncDB = Depends(get_admin_db)
+):
+    """Lead counts per day or per source, batch or country, served from the daily rollups"""
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    # Every new lead changes the rollups, so the versions of all three tables key the cache
+    cache_key = await response_cache.key(request, db, "registrations", "enrollments", "masterclass_registrations")
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        rows = await db.run(lead_analytics, group_by, since, until, lead_type, daily)
+        return response_cache.store(cache_key, JSONResponse({
+            "group_by": group_by,
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "rows": rows,
+            "total": sum(row["count"] for row in rows)
+        }))
+    except Exception as e:
+        logger.error(f"Error fetching lead analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch lead analytics: {str(e)}")
+
+@app.get("/api/export/{kind}")
+async def export_leads(
+    kind: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    since: Optional[datetime] = Query(None, description="Only leads created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only leads created before this time")
+):
+    """Stream all registrations, enrollments or masterclass registrations as CSV or NDJSON"""
+    if kind not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {kind}")
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_export(kind, format, since, until),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/api/debug/tables")
 async def debug_tables():
-    """Debug endpoint to check all tables and their record counts"""
-    from debug_database import check_database_tables
-    
+    """Debug endpoint with every table's row count, pages and index sizes (cached for DB_INTROSPECTION_TTL)"""
     try:
-        results = check_database_tables()
-        return results
+        return await run_db(database_introspection.snapshot, admin=True)
     except Exception as e:
         logger.error(f"Error in debug tables endpoint: {str(e)}")
         return {"error": str(e)}
@@ -0,0 +1,221 @@
+import time
+import functools
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+# Fixed histogram buckets (seconds)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SMS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric, in exposition order
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base for metrics whose samples are sharded per thread.
+
+    Every thread updates only its own shard, so recording needs no lock: the
+    event loop and each DB executor thread write to separate dicts, and
+    render() adds the shards up at scrape time.
+    """
+
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._shards = {}
+        REGISTRY.append(self)
+
+    def _shard(self):
+        shard = self._shards.get(threading.get_ident())
+        if shard is None:
+            shard = self._shards.setdefault(threading.get_ident(), {})
+        return shard
+
+    def _merged(self):
+        merged = {}
+        for shard in list(self._shards.values()):
+            for labels, sample in list(shard.items()):
+                total = merged.get(labels)
+                merged[labels] = list(sample) if total is None else [a + b for a, b in zip(total, sample)]
+        return merged
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, sample in sorted(self._merged().items()):
+            lines.extend(self._render_sample(labels, sample))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        sample = shard.get(labels)
+        if sample is None:
+            shard[labels] = [amount]
+        else:
+            sample[0] += amount
+
+    def _render_sample(self, labels, sample):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {sample[0]:g}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        sample = shard.get(labels)
+        if sample is None:
+            # One count per bucket plus +Inf, then sum and count
+            sample = shard[labels] = [0] * (len(self.buckets) + 3)
+        sample[bisect_left(self.buckets, value)] += 1
+        sample[-2] += value
+        sample[-1] += 1
+
+    def _render_sample(self, labels, sample):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), sample):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            label_text = _labels(self.labelnames, labels, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {sample[-2]:.6f}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {sample[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"), HTTP_BUCKETS)
+
+# Database
+db_latency = Histogram("db_statement_duration_seconds", "SQL statement latency", ("operation", "table"), DB_BUCKETS)
+db_errors = Counter("db_statement_errors_total", "SQL statements that raised", ("operation", "table"))
+
+# Outbound SMS
+sms_latency = Histogram("sms_send_duration_seconds", "Outbound SMS latency", ("kind",), SMS_BUCKETS)
+sms_errors = Counter("sms_send_errors_total", "Outbound SMS failures", ("kind",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and status per route template (not per raw path)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            http_latency.observe(time.perf_counter() - started, scope["method"], path)
+            http_requests.inc(scope["method"], path, str(status))
+
+
+# Statement text -> (operation, table); statements come from a small set of compiled queries
+_statement_labels = {}
+_STATEMENT_LABELS_MAX = 1000
+
+
+def statement_labels(statement: str):
+    labels = _statement_labels.get(statement)
+    if labels is None:
+        words = statement.split()
+        upper = [word.upper() for word in words]
+        operation = upper[0] if upper else "UNKNOWN"
+        table = ""
+        for keyword in ("FROM", "INTO", "UPDATE"):
+            if keyword in upper[:-1]:
+                table = words[upper.index(keyword) + 1].strip('"(')
+                break
+        labels = (operation, table)
+        if len(_statement_labels) < _STATEMENT_LABELS_MAX:
+            _statement_labels[statement] = labels
+    return labels
+
+
+def instrument_engine(engine):
+    """Time every SQL statement run through `engine`"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        db_latency.observe(time.perf_counter() - started, *statement_labels(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def count_error(context):
+        stack = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+        if context.statement:
+            db_errors.inc(*statement_labels(context.statement))
+
+
+def observe_sms(kind: str):
+    """Decorator recording latency and failures of an async SMS send"""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                sms_errors.inc(kind)
+                raise
+            finally:
+                sms_latency.observe(time.perf_counter() - started, kind)
+        return wrapper
+
+    return decorate
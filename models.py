@@ -1,6 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, Float, Index, Table
 from database import Base
 
+
+def lead_indexes(tablename):
+    """Indexes shared by the lead tables: newest-first listings, phone and email lookups"""
+    return (
+        Index(f"ix_{tablename}_created_at_id", "created_at", "id"),
+        Index(f"ix_{tablename}_country_code_phone", "country_code", "phone"),
+        Index(f"ix_{tablename}_email", "email"),
+    )
+
 class Registration(Base):
     """Model for storing basic user registrations (interest in the course)"""
     __tablename__ = "registrations"
@@ -13,6 +22,8 @@ class Registration(Base):
     heard_from = Column(String(50), nullable=True)
     created_at = Column(DateTime, nullable=False)
 
+    __table_args__ = lead_indexes("registrations")
+
 class Enrollment(Base):
     """Model for storing full course enrollments"""
     __tablename__ = "enrollments"
@@ -31,6 +42,8 @@ class Enrollment(Base):
     created_at = Column(DateTime, nullable=False)
     payment_status = Column(Boolean, default=False)
 
+    __table_args__ = lead_indexes("enrollments")
+
 class MasterclassRegistration(Base):
     """Model for storing masterclass registrations"""
     __tablename__ = "masterclass_registrations"
@@ -42,3 +55,75 @@ class MasterclassRegistration(Base):
     country_code = Column(String(10), nullable=False)
     created_at = Column(DateTime, nullable=False)
     attended = Column(Boolean, default=False)
+
+    __table_args__ = lead_indexes("masterclass_registrations")
+
+def archive_table(model):
+    """Table for the archived leads of `model`: the same columns, ids kept, indexed for newest-first reads"""
+    name = f"{model.__tablename__}_archive"
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable, autoincrement=False)
+        for column in model.__table__.columns
+    ]
+    return Table(name, Base.metadata, *columns, Index(f"ix_{name}_created_at_id", "created_at", "id"))
+
+# Lead table name -> table its old leads are moved to (see archive.py)
+ARCHIVE_TABLES = {model.__tablename__: archive_table(model) for model in (Registration, Enrollment, MasterclassRegistration)}
+
+class LeadArchive(Base):
+    """Model for the number of leads moved to each archive table (see archive.py)"""
+    __tablename__ = "lead_archives"
+
+    lead_type = Column(String(40), primary_key=True)
+    rows = Column(Integer, nullable=False, default=0)
+    # created_at of the newest archived lead
+    archived_until = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=False)
+
+class SmsOutbox(Base):
+    """Model for owner SMS notifications waiting to be delivered (transactional outbox)"""
+    __tablename__ = "sms_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    phone = Column(String(20), nullable=False)
+    email = Column(String(100), nullable=True)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    # Cleared once the message is sent or abandoned, so the index only holds live messages
+    next_attempt_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    # Sent messages are purged by this (see outbox.purge_sent_messages)
+    sent_at = Column(DateTime, nullable=True, index=True)
+
+class OTPCode(Base):
+    """Model for OTPs shared between worker processes (see otp_store.SQLiteOTPBackend)"""
+    __tablename__ = "otp_codes"
+
+    phone = Column(String(30), primary_key=True)
+    otp = Column(String(10), nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+class IdempotencyKey(Base):
+    """Model for sign-up retries that replay the first request (see idempotency.py)"""
+    __tablename__ = "idempotency_keys"
+
+    # The primary key is the unique index that rejects a second insert for a key
+    key = Column(String(300), primary_key=True)
+    lead_id = Column(Integer, nullable=False)
+    # Hash of the request body, for keys sent by the client
+    fingerprint = Column(String(32), nullable=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+class LeadRollup(Base):
+    """Model for daily lead counts per dimension, kept current by triggers (see analytics.py)"""
+    __tablename__ = "lead_rollups"
+
+    # Key order serves the analytics reads: one dimension over a range of days
+    dimension = Column(String(40), primary_key=True)
+    day = Column(Date, primary_key=True)
+    lead_type = Column(String(40), primary_key=True)
+    # "" when the lead has no value for the dimension
+    value = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
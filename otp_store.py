@@ -0,0 +1,264 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import engine, run_db
+import models as models
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# OTP settings
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_STORE_CAPACITY = int(os.getenv("OTP_STORE_CAPACITY", "100000"))
+OTP_SWEEP_INTERVAL = float(os.getenv("OTP_SWEEP_INTERVAL", "30"))
+# "sqlite" is shared by all workers; "memory" is an opt-in for a single worker process
+OTP_BACKEND = os.getenv("OTP_BACKEND", "sqlite")
+
+# Results of OTPBackend.verify
+OTP_VALID = "valid"
+OTP_MISSING = "missing"
+OTP_EXPIRED = "expired"
+OTP_INVALID = "invalid"
+
+
+class OTPEntry:
+    """A stored OTP and its expiry time (time.monotonic seconds)"""
+    __slots__ = ("otp", "expires_at")
+
+    def __init__(self, otp: str, expires_at: float):
+        self.otp = otp
+        self.expires_at = expires_at
+
+
+class OTPBackend:
+    """Interface for OTP storage backends.
+
+    verify() must check and consume an OTP atomically, so two concurrent
+    requests can never both succeed with the same code.
+    """
+
+    def __init__(self):
+        self._sweeper = None
+
+    def put(self, key: str, otp: str, ttl: Optional[int] = None):
+        """Store an OTP for `key`, replacing any previous one"""
+        raise NotImplementedError
+
+    def verify(self, key: str, otp: str) -> str:
+        """Check `otp` for `key`; the entry is consumed when it is valid or expired"""
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """Drop every expired entry and return how many were removed"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return size and counters for the debug endpoint"""
+        raise NotImplementedError
+
+    # Async entry points for the endpoints. In-memory backends answer inline on
+    # the event loop; backends doing I/O override these to run off the loop.
+    async def aput(self, key: str, otp: str, ttl: Optional[int] = None):
+        return self.put(key, otp, ttl)
+
+    async def averify(self, key: str, otp: str) -> str:
+        return self.verify(key, otp)
+
+    async def asweep(self) -> int:
+        return self.sweep()
+
+    async def astats(self):
+        return self.stats()
+
+    def start_sweeper(self, interval: float = OTP_SWEEP_INTERVAL):
+        """Sweep expired entries periodically on the running event loop"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval), name="otp-sweeper")
+
+    async def stop_sweeper(self):
+        task, self._sweeper = self._sweeper, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _sweep_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.asweep()
+            except Exception as e:
+                logger.error(f"Error sweeping OTP store: {str(e)}")
+                continue
+            if removed:
+                logger.info(f"Swept {removed} expired OTPs")
+
+
+class MemoryOTPBackend(OTPBackend):
+    """Bounded in-memory OTP store with TTL expiry.
+
+    Lookups go through an ordered dict keyed by phone number. Expiry times are
+    kept in a min-heap so the sweeper only touches entries that are due, and
+    when the store is full the oldest OTP is evicted to make room.
+    """
+
+    def __init__(self, capacity: int = OTP_STORE_CAPACITY, ttl: int = OTP_TTL_SECONDS):
+        super().__init__()
+        self.capacity = capacity
+        self.ttl = ttl
+        self.evicted = 0
+        self.expired = 0
+        self._entries = OrderedDict()
+        self._expiry = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key: str, otp: str, ttl: Optional[int] = None):
+        now = time.monotonic()
+        self.sweep(now)
+
+        if key in self._entries:
+            del self._entries[key]
+        elif len(self._entries) >= self.capacity:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self.evicted += 1
+            logger.warning(f"OTP store full, evicted OTP for {evicted_key}")
+
+        entry = OTPEntry(otp, now + (self.ttl if ttl is None else ttl))
+        self._entries[key] = entry
+        heapq.heappush(self._expiry, (entry.expires_at, key))
+
+        # Replaced OTPs leave stale heap items behind; compact before they pile up
+        if len(self._expiry) > 2 * len(self._entries) + 64:
+            self._expiry = [(e.expires_at, k) for k, e in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    def verify(self, key: str, otp: str) -> str:
+        entry = self._entries.get(key)
+        if entry is None:
+            return OTP_MISSING
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return OTP_EXPIRED
+        if entry.otp != otp:
+            return OTP_INVALID
+        del self._entries[key]
+        return OTP_VALID
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        if now is None:
+            now = time.monotonic()
+        removed = 0
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # Skip heap items left behind by replaced or consumed OTPs
+            if entry is not None and entry.expires_at == expires_at:
+                del self._entries[key]
+                removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+
+
+class SQLiteOTPBackend(OTPBackend):
+    """OTP store in the shared `otp_codes` table, visible to every worker process.
+
+    Expiry uses wall-clock time and is indexed, so sweeping and capacity
+    trimming are index range scans. Capacity is only trimmed by sweep(), to
+    keep put() a single upsert. verify() consumes the code with a single
+    DELETE ... RETURNING, which SQLite executes atomically across processes.
+    """
+
+    def __init__(self, engine, capacity: int = OTP_STORE_CAPACITY, ttl: int = OTP_TTL_SECONDS):
+        super().__init__()
+        self.engine = engine
+        self.capacity = capacity
+        self.ttl = ttl
+        self.table = models.OTPCode.__table__
+
+    def __len__(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar()
+
+    def put(self, key: str, otp: str, ttl: Optional[int] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        stmt = sqlite_insert(self.table).values(phone=key, otp=otp, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.phone],
+            set_={"otp": stmt.excluded.otp, "expires_at": stmt.excluded.expires_at}
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def verify(self, key: str, otp: str) -> str:
+        table = self.table
+        now = time.time()
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                delete(table)
+                .where(table.c.phone == key)
+                .where((table.c.otp == otp) | (table.c.expires_at <= now))
+                .returning(table.c.expires_at)
+            ).first()
+            if row is not None:
+                return OTP_VALID if row.expires_at > now else OTP_EXPIRED
+            exists = conn.execute(select(table.c.phone).where(table.c.phone == key)).first()
+        return OTP_INVALID if exists else OTP_MISSING
+
+    def sweep(self) -> int:
+        table = self.table
+        with self.engine.begin() as conn:
+            removed = conn.execute(delete(table).where(table.c.expires_at <= time.time())).rowcount
+            # Keep only the `capacity` codes that expire last
+            overflow = select(table.c.phone)\
+                .order_by(table.c.expires_at.desc())\
+                .limit(-1)\
+                .offset(self.capacity)
+            removed += conn.execute(delete(table).where(table.c.phone.in_(overflow))).rowcount
+        return removed
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "size": len(self),
+            "capacity": self.capacity
+        }
+
+    async def aput(self, key: str, otp: str, ttl: Optional[int] = None):
+        return await run_db(self.put, key, otp, ttl)
+
+    async def averify(self, key: str, otp: str) -> str:
+        return await run_db(self.verify, key, otp)
+
+    async def asweep(self) -> int:
+        return await run_db(self.sweep)
+
+    async def astats(self):
+        return await run_db(self.stats, admin=True)
+
+
+def create_otp_store(backend: str = OTP_BACKEND) -> OTPBackend:
+    """Build the OTP backend selected by OTP_BACKEND"""
+    if backend == "memory":
+        return MemoryOTPBackend()
+    if backend == "sqlite":
+        return SQLiteOTPBackend(engine)
+    raise ValueError(f"Unknown OTP_BACKEND: {backend}")
@@ -0,0 +1,283 @@
+import os
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+
+from database import SessionLocal, run_db
+import models as models
+from twilio_service import send_sms_to_owner
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Outbox settings
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_BASE_DELAY = float(os.getenv("OUTBOX_BASE_DELAY", "2"))
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", "300"))
+# A claimed message that is not finished within the lease is picked up again
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+# Sent messages are deleted this many days after sending (0 keeps them forever);
+# the poller purges them every OUTBOX_PURGE_INTERVAL seconds, a batch per transaction
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+OUTBOX_PURGE_INTERVAL = float(os.getenv("OUTBOX_PURGE_INTERVAL", "3600"))
+OUTBOX_PURGE_BATCH_SIZE = int(os.getenv("OUTBOX_PURGE_BATCH_SIZE", "500"))
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def enqueue_owner_sms(db, name: str, phone: str, email: str):
+    """Queue an owner notification in the caller's session so it commits with the lead row"""
+    now = datetime.now()
+    db.add(models.SmsOutbox(
+        name=name,
+        phone=phone,
+        email=email,
+        status=PENDING,
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now
+    ))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter for the given number of failed attempts"""
+    ceiling = min(OUTBOX_MAX_DELAY, OUTBOX_BASE_DELAY * (2 ** (attempts - 1)))
+    return random.uniform(0, ceiling)
+
+
+def claim_due_messages(limit: int):
+    """Lease up to `limit` due messages and return their payloads.
+
+    A row is claimed with a conditional UPDATE, so several processes can drain
+    the same table without sending a message twice while its lease is valid.
+    """
+    now = datetime.now()
+    lease_until = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+    outbox = models.SmsOutbox
+    claimed = []
+
+    db = SessionLocal()
+    try:
+        candidates = db.query(outbox.id)\
+            .filter(outbox.next_attempt_at <= now)\
+            .order_by(outbox.next_attempt_at)\
+            .limit(limit)\
+            .all()
+
+        for (message_id,) in candidates:
+            result = db.execute(
+                update(outbox)
+                .where(outbox.id == message_id)
+                .where(outbox.next_attempt_at <= now)
+                .values(status=SENDING, next_attempt_at=lease_until)
+            )
+            if result.rowcount == 1:
+                claimed.append(message_id)
+        db.commit()
+
+        if not claimed:
+            return []
+        rows = db.query(outbox.id, outbox.name, outbox.phone, outbox.email, outbox.attempts)\
+            .filter(outbox.id.in_(claimed))\
+            .all()
+        return [
+            {"id": row.id, "name": row.name, "phone": row.phone, "email": row.email, "attempts": row.attempts}
+            for row in rows
+        ]
+    finally:
+        db.close()
+
+
+def mark_sent(message_id: int):
+    """Record a successful delivery"""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.SmsOutbox)
+            .where(models.SmsOutbox.id == message_id)
+            .values(
+                status=SENT,
+                sent_at=datetime.now(),
+                next_attempt_at=None,
+                last_error=None,
+                attempts=models.SmsOutbox.attempts + 1
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_failed(message_id: int, attempts: int, error: str):
+    """Schedule a retry with backoff, or give up after OUTBOX_MAX_ATTEMPTS"""
+    attempts += 1
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        values = {"status": FAILED, "next_attempt_at": None}
+    else:
+        values = {
+            "status": PENDING,
+            "next_attempt_at": datetime.now() + timedelta(seconds=retry_delay(attempts))
+        }
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.SmsOutbox)
+            .where(models.SmsOutbox.id == message_id)
+            .values(attempts=attempts, last_error=error[:1000], **values)
+        )
+        db.commit()
+    finally:
+        db.close()
+    return values["status"]
+
+
+def purge_sent_messages(before: datetime = None, batch_size: int = OUTBOX_PURGE_BATCH_SIZE) -> int:
+    """Delete messages sent before `before` (by default OUTBOX_RETENTION_DAYS ago) and return how many.
+
+    Abandoned messages are kept so failed notifications can still be looked
+    into. Each batch is its own transaction, so sign-ups get the write lock
+    between batches.
+    """
+    before = before or datetime.now() - timedelta(days=OUTBOX_RETENTION_DAYS)
+    outbox = models.SmsOutbox
+    removed = 0
+    db = SessionLocal()
+    try:
+        while True:
+            batch = select(outbox.id)\
+                .where(outbox.sent_at < before)\
+                .where(outbox.status == SENT)\
+                .limit(batch_size)
+            count = db.execute(delete(outbox).where(outbox.id.in_(batch))).rowcount
+            db.commit()
+            removed += count
+            if count < batch_size:
+                return removed
+    finally:
+        db.close()
+
+
+def outbox_stats():
+    """Return the number of outbox messages per status"""
+    db = SessionLocal()
+    try:
+        rows = db.query(models.SmsOutbox.status, func.count(models.SmsOutbox.id))\
+            .group_by(models.SmsOutbox.status)\
+            .all()
+        return {status: count for status, count in rows}
+    finally:
+        db.close()
+
+
+class OutboxDispatcher:
+    """Background worker pool that drains the SMS outbox with bounded concurrency"""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL, purge_interval: float = OUTBOX_PURGE_INTERVAL):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._next_purge = 0
+        self._queue = None
+        self._wakeup = None
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Start the poller and the worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.batch_size)
+        self._wakeup = asyncio.Event()
+        # Purge on the first poll, then every purge_interval
+        self._next_purge = 0
+        self._tasks = [asyncio.create_task(self._poll(), name="outbox-poller")]
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work(), name=f"outbox-worker-{i}"))
+        logger.info(f"Outbox dispatcher started with {self.workers} workers")
+
+    async def stop(self):
+        """Cancel all tasks; leased messages are retried once their lease expires"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Outbox dispatcher stopped")
+
+    def notify(self):
+        """Wake the poller right away, e.g. after a request committed a new message"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            try:
+                if OUTBOX_RETENTION_DAYS > 0 and loop.time() >= self._next_purge:
+                    self._next_purge = loop.time() + self.purge_interval
+                    removed = await run_db(purge_sent_messages)
+                    if removed:
+                        logger.info(f"Purged {removed} sent messages from the SMS outbox")
+                # Only claim as many rows as the workers can start on, so leases stay short
+                free = self._queue.maxsize - self._queue.qsize()
+                messages = await run_db(claim_due_messages, free) if free else []
+                for message in messages:
+                    await self._queue.put(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling SMS outbox: {str(e)}")
+                messages = []
+
+            if len(messages) < self.batch_size:
+                # asyncio.wait rather than wait_for: on 3.11 wait_for can swallow
+                # stop()'s cancel when notify() fires at the same moment
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait([waiter], timeout=self.poll_interval)
+                finally:
+                    waiter.cancel()
+
+    async def _work(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error updating outbox message {message['id']}: {str(e)}")
+            finally:
+                self._queue.task_done()
+                # Ask for more work as soon as the local queue drains
+                if self._queue.empty():
+                    self.notify()
+
+    async def _deliver(self, message):
+        try:
+            await send_sms_to_owner(message["name"], message["phone"], message["email"])
+        except Exception as e:
+            status = await run_db(mark_failed, message["id"], message["attempts"], str(e))
+            logger.warning(f"Owner SMS for outbox message {message['id']} failed ({status}): {str(e)}")
+            return
+        await run_db(mark_sent, message["id"])
+        logger.info(f"Owner SMS sent for outbox message {message['id']}")
+
+
+# Shared dispatcher for this process
+dispatcher = OutboxDispatcher()
@@ -0,0 +1,96 @@
+import json
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import desc, tuple_
+
+
+def _encode(values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Build an opaque cursor pointing at the row (created_at, id)"""
+    return _encode([created_at.isoformat(), id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor produced by encode_cursor; raises ValueError when it is malformed"""
+    try:
+        created_at, id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_timeline_cursor(created_at: datetime, type: str, id: int) -> str:
+    """Build an opaque cursor pointing at one lead of the merged timeline"""
+    return _encode([created_at.isoformat(), type, id])
+
+
+def decode_timeline_cursor(cursor: str) -> Tuple[datetime, str, int]:
+    """Parse a cursor produced by encode_timeline_cursor; raises ValueError when it is malformed"""
+    try:
+        created_at, type, id = _decode(cursor)
+        return datetime.fromisoformat(created_at), str(type), int(id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_search_cursor(score: float, rowid: int) -> str:
+    """Build an opaque cursor pointing at one search hit"""
+    return _encode([score, rowid])
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    """Parse a cursor produced by encode_search_cursor; raises ValueError when it is malformed"""
+    try:
+        score, rowid = _decode(cursor)
+        return float(score), int(rowid)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _keyset_rows(query, columns, limit: int, after: Optional[Tuple[datetime, int]], offset: int = 0):
+    if after is not None:
+        query = query.filter(tuple_(columns.created_at, columns.id) < tuple_(*after))
+    query = query.order_by(desc(columns.created_at), desc(columns.id))
+    if offset:
+        query = query.offset(offset)
+    return query.limit(limit).all()
+
+
+def keyset_page(query, model, page_size: int, after: Optional[Tuple[datetime, int]] = None, offset: int = 0, archive=None):
+    """Return one page of `query` ordered by (created_at, id) descending, plus the next cursor.
+
+    With `after` the page starts right behind that row using the composite
+    (created_at, id) index, so the cost does not grow with the page depth.
+    `offset` is only kept for clients that still send page numbers.
+
+    `archive` is the table holding the model's archived leads, which are all
+    older than the ones left in the model's table. A page that runs out of
+    rows continues there with the same columns, so cursors and page numbers
+    both reach every lead the totals count.
+    """
+    # Fetch one extra row to learn whether another page exists
+    rows = _keyset_rows(query, model, page_size + 1, after, offset)
+    if archive is not None and len(rows) <= page_size:
+        archived = query.session.query(*[archive.c[description["name"]] for description in query.column_descriptions])
+        if rows or not offset:
+            last = (rows[-1].created_at, rows[-1].id) if rows else after
+            rows += _keyset_rows(archived, archive.c, page_size + 1 - len(rows), last)
+        else:
+            # The offset skips every row in the model's table and the rest of it applies to the archive
+            skipped = query.order_by(None).count()
+            rows = _keyset_rows(archived, archive.c, page_size + 1, None, offset - skipped)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
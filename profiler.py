@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import hmac
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fraction of requests profiled automatically (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests sending "X-Profile: <token>" are always profiled; unset disables the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Where profiles are written, and how many are kept
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+# Stack sampling interval
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+
+# Besides the event loop, the DB executor threads are sampled (see database.py)
+SAMPLED_THREAD_PREFIX = "db"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """Render a stack root-first, frames joined by ';' (the collapsed stack format)"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profile:
+    """Stack samples collected while one request runs"""
+
+    def __init__(self, loop_thread: int):
+        self.loop_thread = loop_thread
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+
+
+class Sampler:
+    """One background thread sampling stacks while any profiled request is running.
+
+    It samples the event loop thread of each profile and the DB executor
+    threads. Concurrent requests share those threads, so under load a profile
+    also contains some of their work; it is a statistical view of where the
+    process spent time while the request was in flight.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, profile: Profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, profile: Profile):
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                profiles = list(self._profiles)
+                if not profiles:
+                    self._thread = None
+                    return
+
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            collapsed = {}
+            for ident, frame in frames.items():
+                name = names.get(ident, "")
+                # Idle executor threads wait inside the pool's _worker loop
+                if ident != me and name.startswith(SAMPLED_THREAD_PREFIX) and frame.f_code.co_name != "_worker":
+                    collapsed[ident] = f"{name};{collapse(frame)}"
+            for profile in profiles:
+                if profile.loop_thread not in collapsed and profile.loop_thread in frames:
+                    collapsed[profile.loop_thread] = f"event-loop;{collapse(frames[profile.loop_thread])}"
+            for profile in profiles:
+                profile.stacks.update(collapsed.values())
+
+            del frames
+            time.sleep(self.interval)
+
+
+def write_profile(directory: str, filename: str, profile: Profile, max_files: int = PROFILE_MAX_FILES):
+    """Write the collapsed stacks and drop the oldest profiles beyond `max_files`"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, filename), "w") as file:
+        for stack, count in profile.stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+    profiles = sorted(entry for entry in os.listdir(directory) if entry.endswith(".collapsed"))
+    for old in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling requests picked by the X-Profile header or PROFILE_SAMPLE_RATE.
+
+    Each profile is written to PROFILE_DIR as collapsed stacks, which
+    speedscope and flamegraph.pl load directly; the file name is returned in
+    the X-Profile-Id response header. Requests that are not picked cost one
+    branch (or a header lookup when PROFILE_TOKEN is set).
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, token: str = PROFILE_TOKEN, directory: str = PROFILE_DIR):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.token = token.encode()
+        self.directory = directory
+        self.enabled = sample_rate > 0 or bool(token)
+        self.sampler = Sampler()
+
+    def wanted(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not self.wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(threading.get_ident())
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        filename = f"{stamp}-{scope['method']}-{slug}.collapsed"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", filename.encode())]
+            await send(message)
+
+        self.sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.sampler.stop(profile)
+            elapsed = (time.perf_counter() - profile.started) * 1000
+            if profile.stacks:
+                try:
+                    await asyncio.to_thread(write_profile, self.directory, filename, profile)
+                    logger.info(f"Profiled {scope['method']} {scope['path']} ({elapsed:.1f} ms, {sum(profile.stacks.values())} samples): {filename}")
+                except OSError as e:
+                    logger.error(f"Error writing profile {filename}: {str(e)}")
@@ -0,0 +1,95 @@
+import os
+import math
+import time
+import logging
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# OTP sends per phone number: a burst of OTP_PHONE_BURST, then one every OTP_PHONE_REFILL_SECONDS
+OTP_PHONE_BURST = int(os.getenv("OTP_PHONE_BURST", "3"))
+OTP_PHONE_REFILL_SECONDS = float(os.getenv("OTP_PHONE_REFILL_SECONDS", "60"))
+# OTP sends per client IP
+OTP_IP_BURST = int(os.getenv("OTP_IP_BURST", "10"))
+OTP_IP_REFILL_SECONDS = float(os.getenv("OTP_IP_REFILL_SECONDS", "6"))
+# Buckets kept per limiter; the least recently used one is dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000"))
+# Behind one reverse proxy (e.g. Render) the client IP is the last X-Forwarded-For entry
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets with a bounded number of keys.
+
+    Each key may spend `burst` tokens at once and regains one every
+    `refill_seconds`. Buckets are refilled lazily when the key is seen again,
+    so a check is one dict lookup and a little arithmetic. The buckets live in
+    an LRU: beyond `max_keys` the least recently used bucket is dropped, which
+    only forgets keys that have been idle longest.
+    """
+
+    def __init__(self, name: str, burst: int, refill_seconds: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.burst = burst
+        self.rate = 1 / refill_seconds
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.limited = 0
+        self._buckets = OrderedDict()
+
+    def acquire(self, key: str, now: float = None) -> float:
+        """Spend one token for `key`; returns 0 when allowed, else the seconds until a token is available"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0
+        self.limited += 1
+        return (1 - bucket[0]) / self.rate
+
+    def stats(self):
+        return {"keys": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+# Limiters for the SMS-sending OTP endpoints (per process)
+otp_ip_limiter = TokenBucketLimiter("otp_ip", OTP_IP_BURST, OTP_IP_REFILL_SECONDS)
+otp_phone_limiter = TokenBucketLimiter("otp_phone", OTP_PHONE_BURST, OTP_PHONE_REFILL_SECONDS)
+
+
+def check_otp_rate_limit(request: Request, phone: str):
+    """Raise a 429 with Retry-After when the client IP or the phone number is over its limit"""
+    ip = client_ip(request)
+    for limiter, key in ((otp_ip_limiter, ip), (otp_phone_limiter, phone)):
+        retry_after = limiter.acquire(key)
+        if retry_after:
+            logger.warning(f"OTP request for {phone} from {ip} rate limited by {limiter.name}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many OTP requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+
+def rate_limit_stats():
+    return {limiter.name: limiter.stats() for limiter in (otp_ip_limiter, otp_phone_limiter)}
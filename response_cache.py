@@ -0,0 +1,102 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request, Response
+
+from lead_summary import lead_summary
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of cached response bodies kept per process
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+
+class CacheKey:
+    __slots__ = ("key", "etag")
+
+    def __init__(self, key, etag: str):
+        self.key = key
+        self.etag = etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value names `etag` (or is *)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" and "x" match each other
+    return "*" in candidates or etag.removeprefix("W/") in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+class ResponseCache:
+    """In-process cache of admin read responses, keyed by (route, params, write version).
+
+    The version comes from the lead summary and changes with every new lead in
+    the tables a route reads, so entries never need to be invalidated: a write
+    makes new keys and old entries fall out of the LRU. The ETag is a hash of
+    the key, so a matching If-None-Match gets a 304 before any database work.
+    It is weak: a response rebuilt after its entry was evicted holds the same
+    data but not the same bytes (e.g. a newer timestamp).
+    """
+
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def key(self, request: Request, db, *categories) -> CacheKey:
+        """Build the cache key and ETag for `request`, which reads the lead `categories`"""
+        # Only reads the database when the summary is not loaded or, with several
+        # workers, to check whether another process wrote
+        if lead_summary.needs_refresh():
+            await db.run(lead_summary.refresh)
+        params = tuple(sorted(request.query_params.multi_items()))
+        key = (request.url.path, params, lead_summary.version(*categories))
+        digest = hashlib.blake2b(repr((lead_summary.epoch, key)).encode(), digest_size=12).hexdigest()
+        return CacheKey(key, f'W/"{digest}"')
+
+    def lookup(self, request: Request, cache_key: CacheKey) -> Optional[Response]:
+        """Return a 304 or the cached response for `cache_key`, or None on a miss"""
+        headers = {"ETag": cache_key.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), cache_key.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        with self._lock:
+            entry = self._entries.get(cache_key.key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key.key)
+            self.hits += 1
+        body, media_type = entry
+        return Response(body, media_type=media_type, headers=headers)
+
+    def store(self, cache_key: CacheKey, response: Response) -> Response:
+        """Cache a successful response under `cache_key` and tag it with the ETag"""
+        response.headers["ETag"] = cache_key.etag
+        response.headers["Cache-Control"] = "no-cache"
+        if response.status_code == 200:
+            with self._lock:
+                self._entries[cache_key.key] = (response.body, response.media_type)
+                self._entries.move_to_end(cache_key.key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return response
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+# Shared response cache for this process
+response_cache = ResponseCache()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Generic, TypeVar
 from datetime import datetime
 
 class PhoneNumber(BaseModel):
@@ -108,9 +108,23 @@ class MasterclassRegistrationItem(BaseModel):
     created_at: datetime
     attended: bool
 
-class PaginatedResponse(BaseModel):
-    items: List[Any]
+ItemT = TypeVar("ItemT")
+
+class PaginatedResponse(BaseModel, Generic[ItemT]):
+    items: List[ItemT]
     total: int
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = None
+
+class TimelineResponse(BaseModel):
+    items: List[Any]
+    total: int
+    page_size: int
+    next_cursor: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    items: List[Any]
+    page_size: int
+    next_cursor: Optional[str] = None
@@ -0,0 +1,32 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+
+import schemas as schemas
+
+
+def item_columns(model, item_schema):
+    """Columns of `model` named by the fields of `item_schema`.
+
+    Querying these instead of the model returns plain row tuples, which skips
+    building ORM objects and registering them in the session's identity map.
+    """
+    return [getattr(model, name) for name in item_schema.model_fields]
+
+
+class PageEncoder:
+    """JSON encoder for one PaginatedResponse[item] type.
+
+    The validator and serializer are compiled by pydantic-core once, at import
+    time. Rows are read by attribute straight into the items, and the page is
+    dumped to bytes in one call instead of FastAPI's generic jsonable_encoder
+    walk over a List[Any].
+    """
+
+    def __init__(self, item_schema):
+        self.adapter = TypeAdapter(schemas.PaginatedResponse[item_schema])
+
+    def encode(self, **page) -> bytes:
+        return self.adapter.dump_json(self.adapter.validate_python(page))
+
+    def response(self, **page) -> Response:
+        return Response(self.encode(**page), media_type="application/json")
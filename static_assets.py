@@ -0,0 +1,213 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+from response_cache import etag_matches
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Browsers and CDNs may keep a static asset this long (seconds)
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))
+# How often the file is stat'ed again to pick up a replaced asset (seconds)
+STATIC_CHECK_INTERVAL = float(os.getenv("STATIC_CHECK_INTERVAL", "5"))
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int):
+    """Return the inclusive (start, end) of a single `bytes=` range, or None to send the whole file.
+
+    Malformed and multi-range headers, and ranges whose last byte comes before
+    their first, are ignored, as RFC 9110 allows; a range starting past the
+    end of the file raises RangeNotSatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[len("bytes="):].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+class AssetInfo:
+    __slots__ = ("size", "mtime_ns", "etag", "last_modified", "modified_at")
+
+    def __init__(self, size: int, mtime_ns: int, etag: str):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = etag
+        self.modified_at = mtime_ns // 1_000_000_000
+        self.last_modified = formatdate(self.modified_at, usegmt=True)
+
+
+class StaticAsset:
+    """A file served with validators computed once, not on every request.
+
+    The file is hashed for a strong ETag when first loaded and again only when
+    its size or mtime changes, which is checked at most every
+    STATIC_CHECK_INTERVAL seconds. Responses support conditional GETs, single
+    byte ranges (so interrupted downloads resume) and zero-copy sendfile where
+    the ASGI server offers it.
+    """
+
+    def __init__(self, path: str, media_type: str, filename: Optional[str] = None):
+        self.path = path
+        self.media_type = media_type
+        self.filename = filename
+        self.info = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Optional[AssetInfo]:
+        """Stat the file and rehash it if it changed; returns None when it is missing"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                if self.info is not None:
+                    logger.warning(f"Static asset {self.path} disappeared")
+                self.info = None
+                return None
+
+            info = self.info
+            if info is None or (info.size, info.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                digest = hashlib.sha256()
+                with open(self.path, "rb") as file:
+                    for block in iter(lambda: file.read(1024 * 1024), b""):
+                        digest.update(block)
+                info = AssetInfo(stat.st_size, stat.st_mtime_ns, f'"{digest.hexdigest()[:32]}"')
+                self.info = info
+                logger.info(f"Static asset {self.path} loaded: {info.size} bytes, ETag {info.etag}")
+            return info
+
+    async def current(self) -> Optional[AssetInfo]:
+        if self._checked_at is None or time.monotonic() - self._checked_at >= STATIC_CHECK_INTERVAL:
+            return await asyncio.to_thread(self.refresh)
+        return self.info
+
+    def not_modified(self, request: Request, info: AssetInfo) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            return etag_matches(if_none_match, info.etag)
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return info.modified_at <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def response(self, request: Request) -> Optional[Response]:
+        """Build the (possibly 304 or 206) response for `request`, or None when the file is missing"""
+        info = await self.current()
+        if info is None:
+            return None
+
+        headers = {
+            "ETag": info.etag,
+            "Last-Modified": info.last_modified,
+            "Cache-Control": f"public, max-age={STATIC_MAX_AGE}",
+            "Accept-Ranges": "bytes",
+        }
+        if self.not_modified(request, info):
+            return Response(status_code=304, headers=headers)
+
+        if self.filename:
+            headers["Content-Disposition"] = f'attachment; filename="{self.filename}"'
+
+        # A stale If-Range means the client's partial copy is outdated: send everything
+        byte_range = None
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range in (info.etag, info.last_modified):
+            try:
+                byte_range = parse_range(request.headers.get("range"), info.size)
+            except RangeNotSatisfiable:
+                headers["Content-Range"] = f"bytes */{info.size}"
+                return Response(status_code=416, headers=headers)
+
+        if byte_range is None:
+            start, end, status_code = 0, info.size - 1, 200
+        else:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+        # Open the file before any header is sent, so one removed since the
+        # last stat gets a 404 instead of a 200 with no body
+        try:
+            file = await asyncio.to_thread(open, self.path, "rb")
+        except OSError:
+            await asyncio.to_thread(self.refresh)
+            return None
+        return FileRangeResponse(file, start, end - start + 1, status_code, headers, self.media_type)
+
+
+class FileRangeResponse(Response):
+    """Send `length` bytes of an open file from `offset`, with sendfile when the server supports it.
+
+    The response owns the file and closes it once sent.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, file, offset: int, length: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.file = file
+        self.offset = offset
+        self.length = length
+
+    async def __call__(self, scope, receive, send):
+        file = self.file
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                # The server copies file -> socket in the kernel
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False
+                })
+                return
+
+            offset, remaining = self.offset, self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, file.fileno(), min(self.chunk_size, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            # Empty file, or the file shrank under us and the client gets a short body
+            if remaining > 0 or self.length == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await asyncio.to_thread(file.close)
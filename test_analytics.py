@@ -0,0 +1,21 @@
+"""Daily lead rollups and /api/analytics/leads"""
+from datetime import date
+
+from conftest import assert_indexed, seed_leads
+
+
+def test_analytics_reads_rollups(api, statements):
+    main, client = api
+    before = client.get("/api/analytics/leads", params={"group_by": "heard_from", "lead_type": "enrollments"}).json()
+    seed_leads(client, count=3)
+    statements.clear()
+
+    after = client.get("/api/analytics/leads", params={"group_by": "heard_from", "lead_type": "enrollments"}).json()
+    assert after["total"] == before["total"] + 3
+    days = client.get("/api/analytics/leads", params={"since": date.today().isoformat()}).json()
+    assert {row["lead_type"] for row in days["rows"]} == {"registrations", "enrollments", "masterclass_registrations"}
+
+    # The counts come from the rollups' primary key, never from a pass over the lead tables
+    rollups = [statement for statement, _ in statements if "lead_rollups" in statement]
+    assert rollups and not any("count(" in statement.lower() for statement, _ in statements)
+    assert_indexed(main.engine, statements)
@@ -0,0 +1,45 @@
+"""Catalog introspection behind /api/debug/tables"""
+from conftest import seed_leads
+
+
+def test_debug_tables_reports_rows_and_sizes(api):
+    main, client = api
+    seed_leads(client, count=3)
+    main.database_introspection.invalidate()
+
+    report = client.get("/api/debug/tables").json()
+    page_size = report["database"]["page_size"]
+    tables = report["tables"]
+    for name in ("registrations", "enrollments", "masterclass_registrations"):
+        table = tables[name]
+        assert table["rows"] == 3
+        assert table["pages"] >= 1 and table["bytes"] == table["pages"] * page_size
+        assert set(table["indexes"]) >= {f"ix_{name}_created_at_id", f"ix_{name}_country_code_phone", f"ix_{name}_email"}
+        for index in table["indexes"].values():
+            assert index["pages"] >= 1 and index["bytes"] == index["pages"] * page_size
+
+    # The FTS5 index has no b-tree of its own: no row count, and its shadow tables are folded into it
+    search = tables["lead_search"]
+    assert search["virtual"] and search["rows"] is None
+    assert {"lead_search_data", "lead_search_idx", "lead_search_config"} <= set(search["shadow_tables"])
+    assert not set(search["shadow_tables"]) & set(tables)
+    assert search["pages"] == sum(shadow["pages"] for shadow in search["shadow_tables"].values()) > 0
+    assert search["shadow_tables"]["lead_search_docsize"]["rows"] == 9
+
+
+def test_debug_tables_snapshot_is_reused_within_the_ttl(api):
+    main, client = api
+    main.database_introspection.invalidate()
+    first = client.get("/api/debug/tables").json()
+    seed_leads(client, count=1)
+
+    # Within DB_INTROSPECTION_TTL the same snapshot is served, only older
+    cached = client.get("/api/debug/tables").json()
+    assert cached["generated_at"] == first["generated_at"]
+    assert cached["tables"] == first["tables"]
+    assert cached["age_seconds"] >= first["age_seconds"]
+
+    main.database_introspection.invalidate()
+    fresh = client.get("/api/debug/tables").json()
+    assert fresh["generated_at"] != first["generated_at"]
+    assert fresh["tables"]["registrations"]["rows"] == first["tables"]["registrations"]["rows"] + 1
@@ -0,0 +1,22 @@
+"""Idempotent sign-ups: Idempotency-Key replays and the duplicate window"""
+from conftest import assert_indexed
+
+
+def test_retried_signups_are_replayed(api, statements):
+    main, client = api
+    registration = {"name": "Retry", "phone": "9300000000", "email": "retry@example.com"}
+    first = client.post("/api/register", json=registration, headers={"Idempotency-Key": "retry-1"})
+    retry = client.post("/api/register", json=registration, headers={"Idempotency-Key": "retry-1"})
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert client.post("/api/register", json=dict(registration, name="Other"), headers={"Idempotency-Key": "retry-1"}).status_code == 422
+
+    # Without a key, a second sign-up from the same phone within the window is a duplicate
+    masterclass = {"name": "Retry", "phone": "9300000001"}
+    first = client.post("/api/masterclass-register", json=masterclass).json()["id"]
+    # Answered from the table rather than the in-memory LRU
+    main.lead_idempotency._recent.clear()
+    assert client.post("/api/masterclass-register", json=masterclass).json()["id"] == first
+
+    main.lead_idempotency.sweep()
+    assert_indexed(main.engine, statements)
@@ -0,0 +1,89 @@
+"""Streaming CSV / NDJSON lead exports"""
+import io
+import csv
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import assert_indexed, seed_leads
+
+
+@pytest.mark.parametrize("kind", ["registrations", "enrollments", "masterclass-registrations"])
+def test_export_query_uses_index(api, statements, kind):
+    main, client = api
+    seed_leads(client, count=2)
+    statements.clear()
+
+    response = client.get(f"/api/export/{kind}", params={"format": "ndjson", "since": "2000-01-01T00:00:00", "until": "2100-01-01T00:00:00"})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) >= 2
+    assert_indexed(main.engine, statements)
+
+
+def add_registrations(main, *leads):
+    """Insert registrations with fixed created_at values; returns their ids in order"""
+    db = main.SessionLocal()
+    try:
+        rows = [main.models.Registration(country_code="+91", **lead) for lead in leads]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+# Long before the seeded leads, so a range around it holds only these
+EXPORT_LEADS = [
+    {"name": 'Doe, "JJ"\nJr', "email": None, "phone": "9700000000", "heard_from": "friend", "created_at": datetime(2001, 1, 1)},
+    {"name": "Plain", "email": "plain@example.com", "phone": "9700000001", "heard_from": None, "created_at": datetime(2001, 1, 2)},
+    {"name": "Until", "email": "until@example.com", "phone": "9700000002", "heard_from": None, "created_at": datetime(2001, 1, 3)},
+]
+RANGE = {"since": "2001-01-01T00:00:00", "until": "2001-01-03T00:00:00"}
+
+
+@pytest.fixture(scope="module")
+def exported_ids(api):
+    main, _ = api
+    return add_registrations(main, *EXPORT_LEADS)
+
+
+def test_csv_export(api, exported_ids):
+    main, client = api
+    response = client.get("/api/export/registrations", params=dict(RANGE, format="csv"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"].startswith('attachment; filename="registrations-')
+
+    # Quotes are doubled and cells with commas, quotes or newlines are quoted
+    assert '"Doe, ""JJ""\nJr"' in response.text
+    header, *rows = list(csv.reader(io.StringIO(response.text)))
+    assert header == [column.name for column in main.models.Registration.__table__.columns]
+    # since is inclusive and until exclusive; oldest first; None is an empty cell
+    assert rows == [
+        [str(exported_ids[0]), 'Doe, "JJ"\nJr', "", "9700000000", "+91", "friend", "2001-01-01T00:00:00"],
+        [str(exported_ids[1]), "Plain", "plain@example.com", "9700000001", "+91", "", "2001-01-02T00:00:00"],
+    ]
+
+
+def test_ndjson_export(api, exported_ids):
+    _, client = api
+    response = client.get("/api/export/registrations", params=dict(RANGE, format="ndjson"))
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"id": exported_ids[0], "name": 'Doe, "JJ"\nJr', "email": None, "phone": "9700000000",
+         "country_code": "+91", "heard_from": "friend", "created_at": "2001-01-01T00:00:00"},
+        {"id": exported_ids[1], "name": "Plain", "email": "plain@example.com", "phone": "9700000001",
+         "country_code": "+91", "heard_from": None, "created_at": "2001-01-02T00:00:00"},
+    ]
+
+    # Without until the last lead of the range is included; without since, everything before until
+    assert len(client.get("/api/export/registrations", params={"format": "ndjson", "since": RANGE["since"]}).text.splitlines()) >= 3
+    assert len(client.get("/api/export/registrations", params={"format": "ndjson", "until": "2001-01-02T00:00:00"}).text.splitlines()) == 1
+
+
+def test_export_rejects_bad_requests(api):
+    _, client = api
+    assert client.get("/api/export/payments").status_code == 404
+    assert client.get("/api/export/registrations", params={"format": "xml"}).status_code == 422
+    assert client.get("/api/export/registrations", params={"since": RANGE["until"], "until": RANGE["since"]}).status_code == 400
@@ -0,0 +1,24 @@
+"""Full-text lead search on the FTS5 index"""
+import re
+
+from conftest import assert_indexed, seed_leads
+
+
+def test_search_uses_fts_index(api, statements):
+    main, client = api
+    seed_leads(client, count=3)
+    statements.clear()
+
+    first = client.get("/api/leads/search", params={"q": "lead example", "page_size": 2}).json()
+    assert len(first["items"]) == 2 and first["next_cursor"]
+    second = client.get("/api/leads/search", params={"q": "lead example", "page_size": 2, "cursor": first["next_cursor"]}).json()
+    assert not {(item["type"], item["id"]) for item in first["items"]} & {(item["type"], item["id"]) for item in second["items"]}
+
+    # Ranking sorts the matches, but finding them must be an FTS index lookup
+    searches = [(statement, parameters) for statement, parameters in statements if "lead_search MATCH" in statement]
+    assert searches
+    for statement, parameters in searches:
+        with main.engine.connect() as conn:
+            plan = [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+        assert any(re.match(r"SCAN lead_search VIRTUAL TABLE INDEX \d+:M", detail) for detail in plan), plan
+    assert_indexed(main.engine, [captured for captured in statements if captured not in searches])
@@ -0,0 +1,97 @@
+"""In-memory lead summary behind /api/all-leads"""
+from datetime import datetime
+
+from sqlalchemy import event
+
+from conftest import seed_leads, lead_table_reads
+from lead_summary import LeadSummary
+
+
+def test_all_leads_is_served_from_memory(api, statements):
+    main, client = api
+    seed_leads(client, count=1)
+    statements.clear()
+
+    client.get("/api/all-leads")
+    # The outbox poller may run in the background; only the lead tables matter here
+    assert not lead_table_reads(statements)
+
+
+def add_registration(main, name: str):
+    db = main.SessionLocal()
+    try:
+        lead = main.models.Registration(name=name, phone="9300000000", country_code="+91", created_at=datetime.now())
+        db.add(lead)
+        db.commit()
+        db.refresh(lead)
+        db.expunge(lead)
+        return lead
+    finally:
+        db.close()
+
+
+def test_leads_recorded_during_a_rebuild_are_not_lost(api):
+    main, client = api
+    seed_leads(client, count=1)
+    summary = LeadSummary()
+    # Committed before the rebuild reads, but recorded while it runs
+    before = add_registration(main, "Before")
+    after = []
+
+    def sign_up_mid_rebuild(conn, cursor, statement, parameters, context, executemany):
+        # Once the first count has been read, before the rebuild installs its result
+        if not after and "count(" in statement:
+            summary.record("registrations", before)
+            after.append(add_registration(main, "After"))
+            summary.record("registrations", after[0])
+
+    event.listen(main.engine, "after_cursor_execute", sign_up_mid_rebuild)
+    try:
+        db = main.SessionLocal()
+        try:
+            summary.rebuild(db)
+        finally:
+            db.close()
+    finally:
+        event.remove(main.engine, "after_cursor_execute", sign_up_mid_rebuild)
+    assert after
+
+    # Both leads are counted exactly once and the summary keeps following new leads
+    later = add_registration(main, "Later")
+    summary.record("registrations", later)
+    expected = LeadSummary()
+    db = main.SessionLocal()
+    try:
+        expected.rebuild(db)
+    finally:
+        db.close()
+    assert summary.loaded
+    assert summary.snapshot() == expected.snapshot()
+    assert [lead["name"] for lead in summary.snapshot()[1]["registrations"][:3]] == ["Later", "After", "Before"]
+
+
+def test_sign_up_during_startup_warmup_is_counted(api):
+    main, client = api
+    # As on a cold start: the summary is not loaded and warm_caches() rebuilds it in the background
+    main.lead_summary.invalidate()
+    signed_up = []
+
+    def sign_up_mid_warmup(conn, cursor, statement, parameters, context, executemany):
+        if not signed_up and "count(" in statement and "lead_archives" in statement:
+            signed_up.append(client.post("/api/register", json={"name": "Warmup", "phone": "9400000000"}))
+
+    event.listen(main.engine, "after_cursor_execute", sign_up_mid_warmup)
+    try:
+        client.portal.call(main.warm_caches)
+    finally:
+        event.remove(main.engine, "after_cursor_execute", sign_up_mid_warmup)
+    assert signed_up and signed_up[0].status_code == 200
+
+    db = main.SessionLocal()
+    try:
+        registrations = db.query(main.models.Registration).count()
+    finally:
+        db.close()
+    summary = client.get("/api/all-leads").json()
+    assert summary["counts"]["registrations"] == registrations
+    assert summary["recent_leads"]["registrations"][0]["name"] == "Warmup"
@@ -0,0 +1,81 @@
+"""Merged lead timeline: keyset pages across the three lead tables"""
+from datetime import datetime
+
+import pytest
+
+from conftest import assert_indexed, seed_leads, ENROLLMENT
+
+
+def test_timeline_queries_use_indexes(api, statements):
+    main, client = api
+    seed_leads(client)
+    statements.clear()
+
+    first = client.get("/api/leads/timeline", params={"page_size": 5}).json()
+    assert {item["type"] for item in first["items"]} <= {"registration", "enrollment", "masterclass_registration"}
+    client.get("/api/leads/timeline", params={"page_size": 5, "cursor": first["next_cursor"]})
+    assert_indexed(main.engine, statements)
+
+
+# Leads per type at each instant: many share a created_at within and across the tables
+TIED_AT = {
+    datetime(2020, 1, 1, 10): {"registration": 2, "enrollment": 2, "masterclass_registration": 2},
+    datetime(2020, 1, 5, 10): {"registration": 3, "enrollment": 2, "masterclass_registration": 2},
+    datetime(2020, 1, 6, 10): {"registration": 1, "enrollment": 0, "masterclass_registration": 1},
+}
+# Leads before this are archived
+ARCHIVE_CUTOFF = datetime(2020, 1, 3)
+
+
+def tied_lead(main, type: str, created_at: datetime, n: int):
+    fields = {"name": f"Tied {type} {n}", "phone": f"98{n:08d}", "country_code": "+91", "created_at": created_at}
+    if type == "enrollment":
+        fields.update({key: value for key, value in ENROLLMENT.items() if key not in ("name", "phone")})
+    model, _ = main.TIMELINE_TYPES[type]
+    return model(**fields)
+
+
+@pytest.fixture(scope="module")
+def tied_leads(api):
+    """Insert the tied leads and archive the oldest ones"""
+    main, client = api
+    db = main.SessionLocal()
+    try:
+        n = 0
+        for created_at, counts in TIED_AT.items():
+            for type, count in counts.items():
+                for _ in range(count):
+                    db.add(tied_lead(main, type, created_at, n))
+                    n += 1
+        db.commit()
+    finally:
+        db.close()
+    moved = client.portal.call(main.lead_archiver.run, ARCHIVE_CUTOFF)
+    assert sum(moved.values()) == 6
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 5])
+def test_timeline_pages_join_into_one_order(api, tied_leads, page_size):
+    _, client = api
+    full = client.get("/api/leads/timeline", params={"page_size": 100}).json()
+    assert not full["next_cursor"] and len(full["items"]) == full["total"]
+
+    # Newest first; at the same instant by type (masterclass, enrollment, registration) then id, descending
+    ranks = {type: rank for rank, type in enumerate(["registration", "enrollment", "masterclass_registration"])}
+    order = lambda item: (item["created_at"], ranks[item["type"]], item["id"])
+    assert full["items"] == sorted(full["items"], key=order, reverse=True)
+    tied = [item for item in full["items"] if item["name"].startswith("Tied")]
+    assert len(tied) == sum(sum(counts.values()) for counts in TIED_AT.values())
+
+    pages, cursor = [], None
+    while True:
+        params = {"page_size": page_size, "cursor": cursor} if cursor else {"page_size": page_size}
+        page = client.get("/api/leads/timeline", params=params).json()
+        assert len(page["items"]) <= page_size
+        pages += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    # No duplicates or gaps, through the ties and into the archived leads
+    assert pages == full["items"]
+    assert len({(item["type"], item["id"]) for item in pages}) == len(pages)
@@ -0,0 +1,89 @@
+"""Prometheus metrics for routes, SQL statements and outbound SMS"""
+import re
+import math
+
+import pytest
+
+SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>(?:[a-zA-Z_]\w*="(?:[^"\\]|\\.)*",?)*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_exposition(text: str):
+    """Parse the text format strictly: returns {family: type} and [(name, labels, value)]"""
+    assert text.endswith("\n")
+    families, samples, helped = {}, [], set()
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            helped.add(line.split()[2])
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            assert name in helped and kind in ("counter", "histogram")
+            families[name] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"not a sample line: {line!r}"
+            labels = dict(LABEL.findall(match["labels"] or ""))
+            assert ",".join(f'{key}="{value}"' for key, value in labels.items()) == (match["labels"] or "")
+            name = match["name"]
+            family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in families else name
+            assert family in families, f"sample before its # TYPE: {line!r}"
+            samples.append((name, labels, float(match["value"])))
+    return families, samples
+
+
+def value(samples, name, **labels):
+    found = [sample_value for sample_name, sample_labels, sample_value in samples
+             if sample_name == name and all(sample_labels.get(key) == wanted for key, wanted in labels.items())]
+    return sum(found) if found else None
+
+
+@pytest.fixture
+def failing_sms(api):
+    """Install a fake SMS transport whose sends raise, then put the previous one back"""
+    import twilio_service
+    previous = twilio_service._transport
+    transport = twilio_service.FakeSmsTransport(fail_with=RuntimeError("Twilio is down"))
+    twilio_service.set_transport(transport)
+    yield transport
+    twilio_service.set_transport(previous)
+
+
+def test_metrics_exposition(api, failing_sms):
+    _, client = api
+    # One failed send, then two that work
+    assert client.get("/api/test-otp/9800000001").status_code == 500
+    failing_sms.fail_with = None
+    assert client.get("/api/test-otp/9800000002").status_code == 200
+    assert client.get("/api/test-otp/9800000003").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    families, samples = parse_exposition(response.text)
+    assert families["http_request_duration_seconds"] == "histogram" and families["sms_send_errors_total"] == "counter"
+
+    # Routes are labelled with their template, never the raw path
+    route = "/api/test-otp/{phone}"
+    assert not [labels for _, labels, _ in samples if "9800000001" in labels.get("route", "")]
+    assert value(samples, "http_requests_total", route=route, status="200") == 2
+    assert value(samples, "http_requests_total", route=route, status="500") == 1
+
+    # Histogram buckets are cumulative and end at +Inf, which equals _count
+    histograms = {}
+    for name, labels, sample_value in samples:
+        if name.endswith("_bucket"):
+            key = (name, tuple(sorted((k, v) for k, v in labels.items() if k != "le")))
+            histograms.setdefault(key, []).append((labels["le"], sample_value))
+    assert histograms
+    for (name, labels), buckets in histograms.items():
+        bounds = [math.inf if le == "+Inf" else float(le) for le, _ in buckets]
+        counts = [count for _, count in buckets]
+        assert bounds == sorted(bounds) and bounds[-1] == math.inf
+        assert counts == sorted(counts)
+        assert counts[-1] == value(samples, name.replace("_bucket", "_count"), **dict(labels))
+    assert value(samples, "http_request_duration_seconds_count", route=route) == 3
+
+    # SQL statements are timed per operation and table, SMS per kind, with the failure counted
+    assert value(samples, "db_statement_duration_seconds_count", operation="INSERT", table="otp_codes") >= 2
+    assert value(samples, "db_statement_duration_seconds_sum", operation="INSERT", table="otp_codes") > 0
+    assert value(samples, "sms_send_errors_total", kind="otp") == 1
+    assert value(samples, "sms_send_duration_seconds_count", kind="otp") == 3
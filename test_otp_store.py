@@ -0,0 +1,156 @@
+"""OTP stores: single use, TTL expiry and the capacity bound, in memory and in SQLite"""
+import time
+import multiprocessing
+
+import pytest
+
+import otp_store
+import models
+from database import create_db_engine
+from otp_store import MemoryOTPBackend, SQLiteOTPBackend, OTP_VALID, OTP_EXPIRED, OTP_INVALID, OTP_MISSING
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic for the store"""
+    now = [1000.0]
+    monkeypatch.setattr(otp_store.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_otp_is_consumed_once(clock):
+    store = MemoryOTPBackend(capacity=10, ttl=60)
+    store.put("+919000000000", "123456")
+    assert store.verify("+919000000000", "000000") == OTP_INVALID
+    assert store.verify("+919000000000", "123456") == OTP_VALID
+    assert store.verify("+919000000000", "123456") == OTP_MISSING
+
+
+def test_expired_otp_is_rejected_and_dropped(clock):
+    store = MemoryOTPBackend(capacity=10, ttl=60)
+    store.put("+919000000000", "123456")
+    clock[0] += 60
+    assert store.verify("+919000000000", "123456") == OTP_EXPIRED
+    assert len(store) == 0
+
+
+def test_sweep_evicts_only_expired_entries(clock):
+    store = MemoryOTPBackend(capacity=10, ttl=60)
+    store.put("+919000000001", "111111")
+    store.put("+919000000002", "222222", ttl=300)
+    # Replacing an OTP leaves its old expiry behind in the heap; it must not evict the new one
+    store.put("+919000000003", "333333")
+    clock[0] += 30
+    store.put("+919000000003", "444444")
+
+    clock[0] += 31
+    assert store.sweep() == 1
+    assert len(store) == 2 and store.expired == 1
+    assert store.verify("+919000000003", "444444") == OTP_VALID
+
+    clock[0] += 300
+    assert store.sweep() == 1
+    assert len(store) == 0
+
+
+def test_capacity_evicts_the_oldest_otp(clock):
+    store = MemoryOTPBackend(capacity=3, ttl=60)
+    for i in range(5):
+        store.put(f"+91900000000{i}", f"00000{i}")
+    assert len(store) == 3 and store.evicted == 2
+    assert store.verify("+919000000000", "000000") == OTP_MISSING
+    assert store.verify("+919000000001", "000001") == OTP_MISSING
+    assert store.verify("+919000000004", "000004") == OTP_VALID
+
+    # Replacing an OTP for a stored number does not evict anything
+    store.put("+919000000002", "999999")
+    assert len(store) == 2 and store.evicted == 2
+
+
+def test_expired_entries_are_swept_before_evicting(clock):
+    store = MemoryOTPBackend(capacity=2, ttl=60)
+    store.put("+919000000000", "000000")
+    store.put("+919000000001", "000001", ttl=300)
+    clock[0] += 61
+    store.put("+919000000002", "000002")
+    assert store.evicted == 0 and store.expired == 1
+    assert store.verify("+919000000001", "000001") == OTP_VALID
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    """A throwaway database holding only the otp_codes table"""
+    url = f"sqlite:///{tmp_path / 'otp.db'}"
+    engine = create_db_engine(url)
+    models.OTPCode.__table__.create(engine)
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def sqlite_store(database_url):
+    store = SQLiteOTPBackend(create_db_engine(database_url), capacity=3, ttl=60)
+    yield store
+    store.engine.dispose()
+
+
+def test_sqlite_wrong_code_does_not_consume_the_otp(sqlite_store):
+    sqlite_store.put("+919000000000", "123456")
+    assert sqlite_store.verify("+919000000000", "000000") == OTP_INVALID
+    assert sqlite_store.verify("+919000000000", "000000") == OTP_INVALID
+    assert len(sqlite_store) == 1
+    assert sqlite_store.verify("+919000000000", "123456") == OTP_VALID
+
+
+def test_sqlite_otp_is_consumed_once(sqlite_store):
+    sqlite_store.put("+919000000000", "111111")
+    # A new code replaces the previous one
+    sqlite_store.put("+919000000000", "123456")
+    assert sqlite_store.verify("+919000000000", "111111") == OTP_INVALID
+    assert sqlite_store.verify("+919000000000", "123456") == OTP_VALID
+    assert sqlite_store.verify("+919000000000", "123456") == OTP_MISSING
+    assert len(sqlite_store) == 0
+
+
+def test_sqlite_expired_otp_is_rejected_and_dropped(sqlite_store):
+    # Already expired when stored
+    sqlite_store.put("+919000000000", "123456", ttl=-1)
+    assert sqlite_store.verify("+919000000000", "123456") == OTP_EXPIRED
+    assert sqlite_store.verify("+919000000000", "123456") == OTP_MISSING
+
+    # An expired code is dropped whatever code is sent
+    sqlite_store.put("+919000000001", "123456", ttl=-1)
+    assert sqlite_store.verify("+919000000001", "000000") == OTP_EXPIRED
+    assert len(sqlite_store) == 0
+
+
+def test_sqlite_sweep_trims_to_capacity(sqlite_store):
+    sqlite_store.put("+919000000000", "000000", ttl=-1)
+    for i in range(1, 6):
+        sqlite_store.put(f"+91900000000{i}", f"00000{i}", ttl=60 * i)
+    # put() does not trim; the sweeper does
+    assert len(sqlite_store) == 6
+
+    # One expired code, then the codes that expire first until `capacity` are left
+    assert sqlite_store.sweep() == 3
+    assert len(sqlite_store) == 3
+    assert sqlite_store.verify("+919000000002", "000002") == OTP_MISSING
+    assert [sqlite_store.verify(f"+91900000000{i}", f"00000{i}") for i in (3, 4, 5)] == [OTP_VALID] * 3
+
+
+def verify_at(database_url: str, start_at: float) -> str:
+    """Verify the shared code in a separate process, starting at `start_at` (time.time)"""
+    store = SQLiteOTPBackend(create_db_engine(database_url))
+    time.sleep(max(0.0, start_at - time.time()))
+    return store.verify("+919000000000", "123456")
+
+
+def test_sqlite_otp_is_consumed_once_across_processes(sqlite_store, database_url):
+    processes = 8
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        for trial in range(5):
+            sqlite_store.put("+919000000000", "123456")
+            # Leave the first trial time to start the processes
+            start_at = time.time() + (5 if trial == 0 else 0.3)
+            results = pool.starmap(verify_at, [(database_url, start_at)] * processes, chunksize=1)
+            assert sorted(results) == sorted([OTP_VALID] + [OTP_MISSING] * (processes - 1))
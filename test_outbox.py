@@ -0,0 +1,155 @@
+"""Transactional SMS outbox: claiming, leases, retries and retention"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from conftest import assert_indexed
+
+
+@pytest.fixture
+def outbox(api):
+    """The outbox module with the app's dispatcher stopped, so the test claims messages itself"""
+    main, client = api
+    client.portal.call(main.outbox_dispatcher.stop)
+    import outbox
+    yield outbox
+    client.portal.call(main.outbox_dispatcher.start)
+
+
+def queue_message(outbox, name: str) -> int:
+    db = outbox.SessionLocal()
+    try:
+        outbox.enqueue_owner_sms(db, name, "9000000000", None)
+        db.commit()
+        return db.query(outbox.models.SmsOutbox.id).filter_by(name=name).scalar()
+    finally:
+        db.close()
+
+
+def message(outbox, message_id: int):
+    db = outbox.SessionLocal()
+    try:
+        return db.get(outbox.models.SmsOutbox, message_id)
+    finally:
+        db.close()
+
+
+def expire_lease(outbox, message_id: int):
+    """Move the message's lease into the past, as if its worker died OUTBOX_LEASE_SECONDS ago"""
+    db = outbox.SessionLocal()
+    try:
+        db.execute(
+            update(outbox.models.SmsOutbox)
+            .where(outbox.models.SmsOutbox.id == message_id)
+            .values(next_attempt_at=datetime.now() - timedelta(seconds=1))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def claimed_ids(outbox):
+    return {claimed["id"] for claimed in outbox.claim_due_messages(100)}
+
+
+def test_outbox_claim_uses_index(api, statements):
+    main, _ = api
+    from outbox import claim_due_messages
+    claim_due_messages(5)
+    assert_indexed(main.engine, statements)
+
+
+def test_lease_expiry_reclaims_message(outbox):
+    message_id = queue_message(outbox, "Lease")
+    assert message_id in claimed_ids(outbox)
+    assert message(outbox, message_id).status == outbox.SENDING
+
+    # While the lease is valid no other worker or process gets the message
+    assert message_id not in claimed_ids(outbox)
+
+    # The worker died without marking it: once the lease runs out it is claimed again
+    expire_lease(outbox, message_id)
+    assert message_id in claimed_ids(outbox)
+
+    # A sent message is never claimed again
+    outbox.mark_sent(message_id)
+    sent = message(outbox, message_id)
+    assert sent.status == outbox.SENT and sent.next_attempt_at is None and sent.attempts == 1
+    assert message_id not in claimed_ids(outbox)
+
+
+def test_retry_delay_is_exponential_with_full_jitter(outbox, monkeypatch):
+    ceilings = [min(outbox.OUTBOX_MAX_DELAY, outbox.OUTBOX_BASE_DELAY * 2 ** (attempts - 1)) for attempts in range(1, 12)]
+    monkeypatch.setattr(outbox.random, "uniform", lambda low, high: high)
+    assert [outbox.retry_delay(attempts) for attempts in range(1, 12)] == ceilings
+    assert ceilings[-1] == outbox.OUTBOX_MAX_DELAY
+    monkeypatch.setattr(outbox.random, "uniform", lambda low, high: low)
+    assert {outbox.retry_delay(attempts) for attempts in range(1, 12)} == {0}
+
+
+def test_failed_message_is_retried_then_abandoned(outbox):
+    message_id = queue_message(outbox, "Retry")
+    for attempts in range(outbox.OUTBOX_MAX_ATTEMPTS - 1):
+        before = datetime.now()
+        assert outbox.mark_failed(message_id, attempts, "Twilio timed out") == outbox.PENDING
+        failed = message(outbox, message_id)
+        assert failed.attempts == attempts + 1 and failed.last_error == "Twilio timed out"
+        # Scheduled within the backoff ceiling of this attempt
+        ceiling = min(outbox.OUTBOX_MAX_DELAY, outbox.OUTBOX_BASE_DELAY * 2 ** attempts)
+        assert before <= failed.next_attempt_at <= datetime.now() + timedelta(seconds=ceiling)
+
+    assert outbox.mark_failed(message_id, outbox.OUTBOX_MAX_ATTEMPTS - 1, "Twilio timed out") == outbox.FAILED
+    abandoned = message(outbox, message_id)
+    assert abandoned.status == outbox.FAILED and abandoned.next_attempt_at is None
+    assert message_id not in claimed_ids(outbox)
+
+
+def sent_days_ago(outbox, name: str, days: int) -> int:
+    """Queue a message, mark it sent and move its sent_at `days` into the past"""
+    message_id = queue_message(outbox, name)
+    outbox.mark_sent(message_id)
+    db = outbox.SessionLocal()
+    try:
+        db.execute(
+            update(outbox.models.SmsOutbox)
+            .where(outbox.models.SmsOutbox.id == message_id)
+            .values(sent_at=datetime.now() - timedelta(days=days))
+        )
+        db.commit()
+    finally:
+        db.close()
+    return message_id
+
+
+def test_old_sent_messages_are_purged(api, outbox, statements):
+    main, _ = api
+    old = [sent_days_ago(outbox, f"Purge old {n}", outbox.OUTBOX_RETENTION_DAYS + 1 + n) for n in range(3)]
+    recent = sent_days_ago(outbox, "Purge recent", outbox.OUTBOX_RETENTION_DAYS - 1)
+    pending = queue_message(outbox, "Purge pending")
+    abandoned = queue_message(outbox, "Purge abandoned")
+    outbox.mark_failed(abandoned, outbox.OUTBOX_MAX_ATTEMPTS - 1, "Twilio timed out")
+
+    statements.clear()
+    # Batches smaller than the backlog: the purge keeps going until a batch comes up short
+    assert outbox.purge_sent_messages(batch_size=2) == 3
+    assert_indexed(main.engine, [s for s in statements if "sms_outbox" in s[0]])
+    assert [message(outbox, message_id) for message_id in old] == [None, None, None]
+    assert message(outbox, recent).status == outbox.SENT
+    assert message(outbox, pending).status == outbox.PENDING
+    assert message(outbox, abandoned).status == outbox.FAILED
+    assert outbox.purge_sent_messages() == 0
+
+
+def test_dispatcher_purges_when_it_starts(api, outbox):
+    main, client = api
+    old = sent_days_ago(outbox, "Purge on start", outbox.OUTBOX_RETENTION_DAYS + 1)
+    client.portal.call(main.outbox_dispatcher.start)
+    try:
+        deadline = datetime.now() + timedelta(seconds=5)
+        while message(outbox, old) is not None and datetime.now() < deadline:
+            time.sleep(0.05)
+        assert message(outbox, old) is None
+    finally:
+        client.portal.call(main.outbox_dispatcher.stop)
@@ -0,0 +1,68 @@
+"""Opt-in sampling profiler: picking requests, collapsed stack files and retention"""
+import os
+import re
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from profiler import ProfilerMiddleware, Profile, write_profile
+
+COLLAPSED_LINE = re.compile(r"^\S.* \d+$")
+
+
+async def busy():
+    """Keep the event loop busy long enough to be sampled"""
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    return {"done": True}
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    """An app whose requests are profiled when they send X-Profile: secret"""
+    app = FastAPI()
+    app.add_api_route("/busy", busy)
+    app.add_middleware(ProfilerMiddleware, sample_rate=0, token="secret", directory=str(tmp_path))
+    with TestClient(app) as client:
+        yield tmp_path, client
+
+
+def test_wrong_token_is_not_profiled(profiled):
+    directory, client = profiled
+    for headers in ({}, {"X-Profile": "wrong"}, {"X-Profile": "secre"}):
+        response = client.get("/busy", headers=headers)
+        assert response.status_code == 200 and "x-profile-id" not in response.headers
+    assert not os.listdir(directory)
+
+
+def test_profile_is_written_as_collapsed_stacks(profiled):
+    directory, client = profiled
+    response = client.get("/busy", headers={"X-Profile": "secret"})
+    assert response.status_code == 200 and response.json() == {"done": True}
+    filename = response.headers["x-profile-id"]
+    assert filename.endswith("-GET-busy.collapsed") and os.listdir(directory) == [filename]
+
+    lines = (directory / filename).read_text().splitlines()
+    assert lines and all(COLLAPSED_LINE.match(line) for line in lines)
+    # Root first, frames joined by ';', ending in the sample count; the endpoint is on the loop's stacks
+    assert any(line.startswith("event-loop;") and "busy (test_profiler.py:" in line for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) > 1
+
+
+def test_oldest_profiles_are_deleted_beyond_max_files(tmp_path):
+    # Profile names start with their timestamp, so name order is age order
+    old = [f"20200101-00000{i}-GET-busy.collapsed" for i in range(4)]
+    for name in old:
+        (tmp_path / name).write_text("main (app.py:1) 1\n")
+    (tmp_path / "notes.txt").write_text("not a profile")
+
+    profile = Profile(loop_thread=0)
+    profile.stacks.update({"main (app.py:1);work (app.py:5)": 3, "main (app.py:1)": 1})
+    write_profile(str(tmp_path), "20990101-000000-GET-busy.collapsed", profile, max_files=3)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(old[2:] + ["20990101-000000-GET-busy.collapsed", "notes.txt"])
+    # Most common stack first
+    assert (tmp_path / "20990101-000000-GET-busy.collapsed").read_text() == "main (app.py:1);work (app.py:5) 3\nmain (app.py:1) 1\n"
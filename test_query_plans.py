@@ -0,0 +1,41 @@
+"""Query plan regression test.
+
+Drives the API endpoints against a throwaway SQLite database, records every
+SQL statement they run and checks its EXPLAIN QUERY PLAN. A statement fails
+when it scans a table or sorts through a temporary B-tree. The only scans
+accepted are ordered index walks stopped early by a LIMIT (the first page of
+a newest-first listing). The fixtures and checks live in conftest.py and are
+also used by the feature tests.
+
+Run with: python -m pytest test_query_plans.py
+"""
+import pytest
+
+from conftest import assert_indexed, seed_leads
+
+
+def test_otp_queries_use_indexes(api, statements):
+    main, client = api
+    otp = client.get("/api/test-otp/9999999999").json()["otp"]
+    client.post("/api/verify-otp", json={"phone": "9999999999", "otp": "000000" if otp != "000000" else "111111"})
+    client.post("/api/verify-otp", json={"phone": "9999999999", "otp": otp})
+    client.post("/api/verify-otp", json={"phone": "9999999999", "otp": otp})
+    assert_indexed(main.engine, statements)
+
+
+def test_write_queries_use_indexes(api, statements):
+    main, client = api
+    seed_leads(client, count=2)
+    assert_indexed(main.engine, statements)
+
+
+@pytest.mark.parametrize("path", ["/api/registrations", "/api/enrollments", "/api/masterclass-registrations"])
+def test_listing_queries_use_indexes(api, statements, path):
+    main, client = api
+    seed_leads(client)
+    statements.clear()
+
+    first = client.get(path, params={"page_size": 5}).json()
+    assert first["next_cursor"]
+    client.get(path, params={"page_size": 5, "page": 2, "cursor": first["next_cursor"]})
+    assert_indexed(main.engine, statements)
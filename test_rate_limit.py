@@ -0,0 +1,76 @@
+"""Token bucket rate limits on the OTP endpoints"""
+import pytest
+
+
+@pytest.fixture
+def rate_limit(api):
+    """The rate_limit module the app uses, with empty buckets"""
+    import rate_limit
+    for limiter in (rate_limit.otp_ip_limiter, rate_limit.otp_phone_limiter):
+        limiter._buckets.clear()
+    return rate_limit
+
+
+def test_burst_then_refill(rate_limit):
+    limiter = rate_limit.TokenBucketLimiter("test", burst=3, refill_seconds=10)
+    assert [limiter.acquire("key", now=0) for _ in range(3)] == [0, 0, 0]
+    # Empty: the next token is a whole refill away
+    assert limiter.acquire("key", now=0) == pytest.approx(10)
+    assert limiter.acquire("key", now=4) == pytest.approx(6)
+    assert limiter.acquire("key", now=10) == 0
+    # Idle time refills up to the burst and no further
+    assert [limiter.acquire("key", now=1000) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("key", now=1000) > 0
+    assert limiter.stats() == {"keys": 1, "allowed": 7, "limited": 3}
+
+
+def test_keys_are_limited_separately(rate_limit):
+    limiter = rate_limit.TokenBucketLimiter("test", burst=1, refill_seconds=60)
+    assert limiter.acquire("+919000000001", now=0) == 0
+    assert limiter.acquire("+919000000001", now=0) > 0
+    assert limiter.acquire("+919000000002", now=0) == 0
+
+
+def test_least_recently_used_bucket_is_evicted(rate_limit):
+    limiter = rate_limit.TokenBucketLimiter("test", burst=1, refill_seconds=60, max_keys=2)
+    limiter.acquire("a", now=0)
+    limiter.acquire("b", now=0)
+    # Seeing "a" again makes "b" the least recently used
+    assert limiter.acquire("a", now=1) > 0
+    limiter.acquire("c", now=2)
+    assert limiter.stats()["keys"] == 2
+    # "a" is still limited, while "b" was forgotten and starts with a full bucket
+    assert limiter.acquire("a", now=3) > 0
+    assert limiter.acquire("b", now=3) == 0
+
+
+def test_send_otp_over_the_limit_gets_429_with_retry_after(api, rate_limit):
+    _, client = api
+    phone = {"phone": "9600000000", "country_code": "+91"}
+    for _ in range(rate_limit.OTP_PHONE_BURST):
+        assert client.post("/api/send-otp", json=phone).status_code == 200
+
+    limited = client.post("/api/send-otp", json=phone)
+    assert limited.status_code == 429
+    assert 0 < int(limited.headers["retry-after"]) <= rate_limit.OTP_PHONE_REFILL_SECONDS
+    assert rate_limit.rate_limit_stats()["otp_phone"]["limited"] == 1
+
+    # Another number from the same client is not affected
+    assert client.post("/api/send-otp", json=dict(phone, phone="9600000001")).status_code == 200
+
+
+def test_forwarded_clients_get_their_own_ip_buckets(api, rate_limit, monkeypatch):
+    _, client = api
+    # As behind Render's proxy: every request arrives from the same peer address
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", True)
+
+    def send(ip, n):
+        return client.post("/api/send-otp", json={"phone": f"97{n:08d}"},
+                           headers={"X-Forwarded-For": f"203.0.113.7, {ip}"})
+
+    for n in range(rate_limit.OTP_IP_BURST):
+        assert send("198.51.100.1", n).status_code == 200
+    assert send("198.51.100.1", 100).status_code == 429
+    # The proxy appends the real peer last; another client is not limited by the first one
+    assert send("198.51.100.2", 101).status_code == 200
+    assert rate_limit.otp_ip_limiter.stats()["keys"] == 2
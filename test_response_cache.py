@@ -0,0 +1,35 @@
+"""ETags and the versioned response cache of the admin reads"""
+import pytest
+
+from conftest import seed_leads, lead_table_reads
+
+
+@pytest.mark.parametrize("path", ["/api/registrations", "/api/all-leads", "/api/leads/timeline"])
+def test_repeat_polls_skip_the_database(api, statements, path):
+    main, client = api
+    seed_leads(client, count=1)
+    etag = client.get(path).headers["etag"]
+    statements.clear()
+
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(path).headers["etag"] == etag
+    assert not lead_table_reads(statements)
+
+    seed_leads(client, count=1)
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_survives_eviction_as_a_weak_validator(api):
+    main, client = api
+    seed_leads(client, count=1)
+    first = client.get("/api/all-leads")
+    etag = first.headers["etag"]
+    # A rebuilt body (new timestamp) keeps the ETag, which is why it must be weak
+    assert etag.startswith('W/"')
+
+    main.response_cache._entries.clear()
+    rebuilt = client.get("/api/all-leads")
+    assert rebuilt.headers["etag"] == etag
+    assert rebuilt.json()["timestamp"] != first.json()["timestamp"]
+    # Weak comparison: the opaque tag matches with or without the W/ prefix
+    assert client.get("/api/all-leads", headers={"If-None-Match": etag.removeprefix("W/")}).status_code == 304
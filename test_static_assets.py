@@ -0,0 +1,99 @@
+"""Conditional and Range requests for static assets"""
+import pytest
+
+CONTENT = bytes(range(256)) * 4
+SIZE = len(CONTENT)
+
+
+@pytest.fixture
+def asset(api, tmp_path):
+    """A StaticAsset over a temporary file, served at /asset by a small app"""
+    from fastapi import FastAPI, Request, Response
+    from fastapi.testclient import TestClient
+    from static_assets import StaticAsset
+
+    path = tmp_path / "asset.bin"
+    path.write_bytes(CONTENT)
+    static = StaticAsset(str(path), media_type="application/octet-stream")
+    app = FastAPI()
+
+    @app.get("/asset")
+    async def get_asset(request: Request):
+        response = await static.response(request)
+        return response if response is not None else Response(status_code=404)
+
+    with TestClient(app) as client:
+        yield path, client
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=2-5", 2, 5),
+    ("bytes=1000-", 1000, SIZE - 1),
+    # Past the end: cut at the last byte
+    ("bytes=1000-5000", 1000, SIZE - 1),
+    # Suffix: the last N bytes, or the whole file when N is larger
+    ("bytes=-4", SIZE - 4, SIZE - 1),
+    ("bytes=-5000", 0, SIZE - 1),
+])
+def test_range_returns_partial_content(asset, header, start, end):
+    _, client = asset
+    response = client.get("/asset", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{SIZE}"
+    assert response.headers["content-length"] == str(end - start + 1)
+    assert response.content == CONTENT[start:end + 1]
+
+
+@pytest.mark.parametrize("header", [
+    # Multiple ranges are not supported and may be ignored
+    "bytes=0-1,4-5",
+    # Invalid: the last byte comes before the first
+    "bytes=5-3",
+    "bytes=abc",
+    "items=0-1",
+    "bytes=5",
+])
+def test_ignored_range_returns_the_whole_file(asset, header):
+    _, client = asset
+    response = client.get("/asset", headers={"Range": header})
+    assert response.status_code == 200
+    assert "content-range" not in response.headers
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("header", [f"bytes={SIZE}-", f"bytes={SIZE + 10}-{SIZE + 20}", "bytes=-0"])
+def test_unsatisfiable_range(asset, header):
+    _, client = asset
+    response = client.get("/asset", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+
+
+def test_if_range(asset):
+    _, client = asset
+    full = client.get("/asset")
+    etag, last_modified = full.headers["etag"], full.headers["last-modified"]
+
+    # The client's partial copy is current, by ETag or by date: send the range
+    for validator in (etag, last_modified):
+        resumed = client.get("/asset", headers={"Range": "bytes=10-19", "If-Range": validator})
+        assert resumed.status_code == 206 and resumed.content == CONTENT[10:20]
+
+    # The file changed since: send all of it
+    stale = client.get("/asset", headers={"Range": "bytes=10-19", "If-Range": '"outdated"'})
+    assert stale.status_code == 200 and stale.content == CONTENT
+
+
+def test_conditional_get(asset):
+    _, client = asset
+    etag = client.get("/asset").headers["etag"]
+    assert client.get("/asset", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_removed_file_is_not_found(asset):
+    path, client = asset
+    assert client.get("/asset").status_code == 200
+    # Still within STATIC_CHECK_INTERVAL of the last stat: the file is opened before responding
+    path.unlink()
+    assert client.get("/asset", headers={"Range": "bytes=0-9"}).status_code == 404
+    assert client.get("/asset").status_code == 404
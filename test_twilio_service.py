@@ -0,0 +1,34 @@
+"""SMS transports: the Twilio transport's per-request deadline"""
+import time
+import asyncio
+
+import pytest
+
+from twilio_service import TwilioTransport
+
+
+def test_send_gives_up_on_a_stalled_server():
+    async def scenario():
+        # Accepts connections and never answers, like a hung Twilio edge
+        connections = []
+
+        async def accept(reader, writer):
+            connections.append(writer)
+
+        server = await asyncio.start_server(accept, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        transport = TwilioTransport("ACtest", "token", "+15550000000", timeout=0.2)
+        transport.client.api.base_url = f"http://127.0.0.1:{port}"
+        started = time.monotonic()
+        try:
+            with pytest.raises(TimeoutError):
+                await transport.send("+15551111111", "Your code is 123456")
+            return time.monotonic() - started
+        finally:
+            await transport.close()
+            for writer in connections:
+                writer.close()
+            server.close()
+            await server.wait_closed()
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) < 2
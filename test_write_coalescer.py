@@ -0,0 +1,80 @@
+"""Group commits: one failing write in a batch and the after_flush hooks"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+
+@pytest.fixture
+def coalescer(api):
+    """The write_coalescer module, imported against the test database"""
+    import write_coalescer
+    return write_coalescer
+
+
+def sign_up(models, name: str, country_code="+91", hooked=None):
+    """A write adding one registration; with `hooked`, its after_flush hook adds a second row naming its id"""
+    from write_coalescer import after_flush
+
+    def save(session):
+        lead = models.Registration(name=name, phone="9500000000", country_code=country_code, created_at=datetime.now())
+        session.add(lead)
+        if hooked is not None:
+            def add_follow_up(session):
+                # The flush has run, so the lead has its id
+                hooked.append((name, lead.id))
+                session.add(models.Registration(name=f"{name} follow-up {lead.id}", phone="9500000001",
+                                                country_code="+91", created_at=datetime.now()))
+            after_flush(session, add_follow_up)
+        return lead
+    return save
+
+
+def names(main, prefix: str):
+    db = main.SessionLocal()
+    try:
+        return sorted(name for (name,) in db.query(main.models.Registration.name).filter(main.models.Registration.name.startswith(prefix)))
+    finally:
+        db.close()
+
+
+def test_bad_write_fails_alone(api, coalescer):
+    main, client = api
+    batcher = coalescer.WriteCoalescer(window_ms=50)
+
+    async def submit_together():
+        return await asyncio.gather(
+            batcher.submit(sign_up(main.models, "Batch first")),
+            # NOT NULL violation: fails the shared transaction, then its own
+            batcher.submit(sign_up(main.models, "Batch bad", country_code=None)),
+            batcher.submit(sign_up(main.models, "Batch last")),
+            return_exceptions=True
+        )
+
+    first, bad, last = client.portal.call(submit_together)
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["rows"] == 3
+    assert isinstance(bad, IntegrityError)
+    assert first.id and last.id and first.name == "Batch first" and last.name == "Batch last"
+    assert names(main, "Batch") == ["Batch first", "Batch last"]
+
+
+def test_after_flush_hooks_see_ids_and_commit_with_their_write(api, coalescer):
+    main, _ = api
+    hooked = []
+    leads = coalescer.commit_batch([sign_up(main.models, "Hook one", hooked=hooked),
+                                    sign_up(main.models, "Hook two", hooked=hooked)])
+    assert hooked == [("Hook one", leads[0].id), ("Hook two", leads[1].id)]
+    assert names(main, "Hook") == ["Hook one", f"Hook one follow-up {leads[0].id}",
+                                   "Hook two", f"Hook two follow-up {leads[1].id}"]
+
+
+def test_after_flush_hooks_run_with_each_retried_write(api, coalescer):
+    main, _ = api
+    hooked = []
+    good, bad = coalescer.commit_batch([sign_up(main.models, "Retry good", hooked=hooked),
+                                        sign_up(main.models, "Retry bad", country_code=None, hooked=hooked)])
+    assert isinstance(bad, IntegrityError)
+    # The hooks of the failed shared flush never ran; the good write's hook ran again in its own transaction
+    assert hooked == [("Retry good", good.id)]
+    assert names(main, "Retry") == ["Retry good", f"Retry good follow-up {good.id}"]
@@ -1,46 +1,151 @@
 import os
-from twilio.rest import Client
+import asyncio
+import itertools
 from twilio.base.exceptions import TwilioRestException
-from dotenv import load_dotenv
 import logging
 
+from metrics import observe_sms
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Twilio credentials
 account_sid = os.getenv("TWILIO_ACCOUNT_SID")
 auth_token = os.getenv("TWILIO_AUTH_TOKEN")
 twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
+owner_phone = os.getenv("OWNER_PHONE_NUMBER", "+919152091676")  # Your personal mobile
+
+# SMS transport settings: "twilio" or "fake" (in-process, for tests and benchmarks)
+SMS_BACKEND = os.getenv("SMS_BACKEND", "twilio")
+SMS_POOL_SIZE = int(os.getenv("SMS_POOL_SIZE", "100"))
+SMS_TIMEOUT = float(os.getenv("SMS_TIMEOUT", "10"))
+
+class SmsTransport:
+    """Base class for SMS backends used by send_otp and send_sms_to_owner"""
+
+    async def send(self, to: str, body: str) -> str:
+        """Send `body` to `to` and return the provider message id"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Release any connections held by the transport"""
+        pass
+
+
+class TwilioTransport(SmsTransport):
+    """Sends SMS through the Twilio REST API over one keep-alive connection pool.
+
+    The aiohttp session is bound to the event loop it was created on, so the
+    transport is built lazily inside the running loop of each worker process.
+    The Twilio REST client and aiohttp are imported here too, which keeps
+    them out of the import path of a cold start.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 pool_size: int = SMS_POOL_SIZE, timeout: float = SMS_TIMEOUT):
+        # Check if credentials are set
+        if not account_sid:
+            logger.error("TWILIO_ACCOUNT_SID is not set in environment variables")
+        if not auth_token:
+            logger.error("TWILIO_AUTH_TOKEN is not set in environment variables")
+        if not from_number:
+            logger.error("TWILIO_PHONE_NUMBER is not set in environment variables")
+        if not all([account_sid, auth_token, from_number]):
+            raise Exception("Twilio client not initialized. Check your credentials.")
+
+        from twilio.rest import Client
+        from twilio.http.async_http_client import AsyncTwilioHttpClient
+        from aiohttp import ClientSession, TCPConnector
+
+        http_client = AsyncTwilioHttpClient(pool_connections=False)
+        http_client.session = ClientSession(connector=TCPConnector(limit=pool_size, keepalive_timeout=60))
+        self.from_number = from_number
+        self.timeout = timeout
+        self.client = Client(account_sid, auth_token, http_client=http_client)
+
+    async def send(self, to: str, body: str) -> str:
+        # Twilio passes timeout=None on every request, which overrides any session
+        # default, so the deadline is enforced around the whole call
+        try:
+            message = await asyncio.wait_for(
+                self.client.messages.create_async(body=body, from_=self.from_number, to=to),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Twilio did not answer within {self.timeout}s")
+        return message.sid
+
+    async def close(self):
+        await self.client.http_client.close()
+
+
+class FakeSmsTransport(SmsTransport):
+    """In-process transport that records messages instead of sending them"""
+
+    def __init__(self, latency: float = 0.0, fail_with: Exception = None):
+        self.latency = latency
+        self.fail_with = fail_with
+        self.sent = []
+        self._ids = itertools.count(1)
+
+    async def send(self, to: str, body: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_with is not None:
+            raise self.fail_with
+        sid = f"SMFAKE{next(self._ids):026d}"
+        self.sent.append({"sid": sid, "to": to, "body": body})
+        return sid
 
-# Check if credentials are set
-if not account_sid:
-    logger.error("TWILIO_ACCOUNT_SID is not set in environment variables")
-if not auth_token:
-    logger.error("TWILIO_AUTH_TOKEN is not set in environment variables")
-if not twilio_phone:
-    logger.error("TWILIO_PHONE_NUMBER is not set in environment variables")
-
-# Log Twilio configuration (without sensitive data)
-logger.info(f"Twilio configuration loaded. Using phone number: {twilio_phone}")
-
-# Initialize Twilio client
-try:
-    client = Client(account_sid, auth_token)
-    logger.info("Twilio client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Twilio client: {str(e)}")
-    client = None
-
-def send_otp(phone_number: str, otp: str):
-    """Send OTP via Twilio SMS"""
-    if not client:
-        error_msg = "Twilio client not initialized. Check your credentials."
-        logger.error(error_msg)
-        raise Exception(error_msg)
+
+_transport = None
+_transport_loop = None
+
+
+def set_transport(transport: SmsTransport):
+    """Install the transport used by this process (e.g. a FakeSmsTransport in tests)"""
+    global _transport, _transport_loop
+    _transport = transport
+    _transport_loop = None
+
+
+def get_transport() -> SmsTransport:
+    """Return the process-wide transport, creating it on first use"""
+    global _transport, _transport_loop
+    loop = asyncio.get_running_loop()
+    if _transport is not None and (_transport_loop is None or _transport_loop is loop):
+        return _transport
+
+    if SMS_BACKEND == "fake":
+        _transport = FakeSmsTransport()
+        _transport_loop = None
+    elif SMS_BACKEND == "twilio":
+        _transport = TwilioTransport(account_sid, auth_token, twilio_phone)
+        _transport_loop = loop
+        # Log Twilio configuration (without sensitive data)
+        logger.info(f"Twilio transport initialized. Using phone number: {twilio_phone}")
+    else:
+        raise ValueError(f"Unknown SMS_BACKEND: {SMS_BACKEND}")
+    return _transport
+
+
+async def close_transport():
+    """Close the process-wide transport, e.g. on application shutdown"""
+    global _transport, _transport_loop
+    transport, _transport, _transport_loop = _transport, None, None
+    if transport is not None:
+        await transport.close()
+
+
+@observe_sms("otp")
+async def send_otp(phone_number: str, otp: str):
+    """Send OTP via SMS"""
+    try:
+        transport = get_transport()
+    except Exception as e:
+        logger.error(str(e))
+        raise
         
     try:
         logger.info(f"Sending OTP to {phone_number}")
@@ -49,13 +154,9 @@ def send_otp(phone_number: str, otp: str):
         if not phone_number.startswith('+'):
             logger.warning(f"Phone number {phone_number} doesn't start with '+'. This might cause issues.")
         
-        message = client.messages.create(
-            body=f"Your RByte.ai verification code is: {otp}",
-            from_=twilio_phone,
-            to=phone_number
-        )
-        logger.info(f"OTP sent successfully to {phone_number}. Message SID: {message.sid}")
-        return message.sid
+        sid = await transport.send(phone_number, f"Your RByte.ai verification code is: {otp}")
+        logger.info(f"OTP sent successfully to {phone_number}. Message SID: {sid}")
+        return sid
     except TwilioRestException as e:
         error_code = e.code
         error_msg = e.msg
@@ -82,19 +183,9 @@ def verify_otp(phone_number: str, otp: str):
     pass
 
 
-def send_sms_to_owner(name: str, phone: str, email: str):
-    # Load credentials from environment
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
-    owner_phone = "+919152091676"  # Your personal mobile
-
-    if not all([account_sid, auth_token, twilio_phone, owner_phone]):
-        raise ValueError("Missing one or more Twilio environment variables.")
-
-    # Initialize Twilio client
-    client = Client(account_sid, auth_token)
-
+@observe_sms("owner")
+async def send_sms_to_owner(name: str, phone: str, email: str):
+    """Notify the owner about a new lead"""
     # Compose and send message
     message_body = f"""
     📣 New Masterclass Registration
@@ -104,10 +195,4 @@ def send_sms_to_owner(name: str, phone: str, email: str):
     📧 Email: {email}
     """
 
-    message = client.messages.create(
-        body=message_body,
-        from_=twilio_phone,
-        to=owner_phone
-    )
-
-    return message.sid  # Optional: useful for logging
\ No newline at end of file
+    return await get_transport().send(owner_phone, message_body)  # Optional: useful for logging
@@ -0,0 +1,137 @@
+import os
+import asyncio
+import logging
+
+from database import SessionLocal, run_db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Inserts arriving within the window (or until the batch is full) share one commit
+WRITE_COALESCE_WINDOW_MS = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "2"))
+WRITE_COALESCE_MAX_BATCH = int(os.getenv("WRITE_COALESCE_MAX_BATCH", "64"))
+
+
+class WriteCoalescer:
+    """Group commit for the write endpoints.
+
+    Each request submits a function that adds its rows to a session. Functions
+    submitted within a few milliseconds run in one transaction, so a burst of
+    sign-ups pays for one commit (and one fsync) instead of one per request.
+    Primary keys come back from the flush, so no refresh SELECT is needed.
+    If the shared transaction fails, every function is retried in its own
+    transaction so one bad row cannot fail the others.
+    """
+
+    def __init__(self, window_ms: float = WRITE_COALESCE_WINDOW_MS, max_batch: int = WRITE_COALESCE_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rows = 0
+        self._pending = []
+        self._timer = None
+        self._flushing = set()
+
+    async def submit(self, fn):
+        """Run `fn(session)` in the next group commit and return its result once committed"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((fn, future))
+
+        if len(self._pending) >= self.max_batch or self.window <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    async def drain(self):
+        """Commit anything still pending, e.g. on shutdown"""
+        if self._pending:
+            self._flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "average_batch": round(self.rows / self.batches, 2) if self.batches else 0
+        }
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._commit(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _commit(self, batch):
+        try:
+            results = await run_db(commit_batch, [fn for fn, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def after_flush(session, hook):
+    """Run `hook(session)` once the batch is flushed, before it commits, e.g. to add rows needing generated ids"""
+    session.info.setdefault("after_flush", []).append(hook)
+
+
+def run_batch(db, functions):
+    """Run the functions and their after_flush hooks; the caller commits"""
+    db.info.clear()
+    results = [fn(db) for fn in functions]
+    # One flush inserts the rows of every function, batched by table
+    db.flush()
+    for hook in db.info.pop("after_flush", []):
+        hook(db)
+    return results
+
+
+def commit_batch(functions):
+    """Run every function in one transaction; fall back to one transaction each on failure"""
+    # Objects stay readable after commit, so ids can be returned without a refresh
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        try:
+            results = run_batch(db, functions)
+            db.commit()
+            return results
+        except Exception as e:
+            db.rollback()
+            if len(functions) == 1:
+                return [e]
+            logger.warning(f"Group commit of {len(functions)} writes failed, retrying one by one: {str(e)}")
+
+        results = []
+        for fn in functions:
+            try:
+                [result] = run_batch(db, [fn])
+                db.commit()
+                # Detach the committed rows, or a later write's rollback would expire them
+                db.expunge_all()
+                results.append(result)
+            except Exception as e:
+                db.rollback()
+                results.append(e)
+        return results
+    finally:
+        db.close()
+
+
+# Shared coalescer for this process
+write_coalescer = WriteCoalescer()